@@ -1,114 +1,194 @@
+import asyncio
+import contextlib
 import datetime
+import hmac
 import logging
 import os
-import re
+import time
 import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+import backoff
 import httpx
-from dotenv import load_dotenv
 from fastapi import FastAPI, Request as FastAPIRequest, HTTPException
-from fastapi.responses import StreamingResponse
-from upstash_redis.asyncio import Redis as AsyncRedis
-from upstash_redis import Redis as SyncRedis
-from upstash_ratelimit import Ratelimit, SlidingWindow
-from utils.logger import logger
-from starlette.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from utils.logger import logger, init_sentry
+from api.utils.stream_transport import create_transport
+from api.utils.stream_dispatcher import create_dispatcher, parse_entry_id
+from api.utils.poll_scheduler import create_poll_scheduler
+from api.utils.stream_acks import AckBatcher
+from api.utils.http_client import http_clients
+from api.utils.ratelimit import SlidingWindowRateLimiter
+from api.utils.sanitizer import sanitize_content
+from api.utils import metrics
+from api.utils import sse
+from api.utils import chunk_protocol
+from api.utils.stream_cache import TerminalStreamCache
+from api.utils.stream_lifecycle import StreamLifecycle
+from api.utils.client_stream import ClientStreamingResponse
+from api.utils.singleflight import PromptSingleflight, follower_stream_id, source_stream_id
+from api.utils.drain import drain, recover_hint
+from api.utils.circuit_breaker import CLOSED, OPEN, CircuitBreaker, CircuitOpenError
 from starlette.background import BackgroundTask
 
-
-# Load environment variables from .env file
-load_dotenv()
+# .env is loaded once, by utils.logger, before anything below reads the environment.
 
 # Blocking httpx logs for chunks that crowd out everything else
 logging.getLogger("httpx").setLevel(logging.WARNING)
+# Per-poll/per-chunk debug logs; sampled by LOG_SAMPLE_RATES (1% by default)
+stream_logger = logging.getLogger("chatraghu.stream")
 
 
 # Initialize Redis and Rate Limiter from environment variables
-# redis = AsyncRedis.from_url(os.getenv("UPSTASH_REDIS_REST_URL"))
-redis = AsyncRedis.from_env()
-# sync redis for rate limiter, required by upstash_ratelimit
-ratelimit = Ratelimit(
-    redis=SyncRedis.from_env(),
-    limiter=SlidingWindow(max_requests=3, window=10),
+# Stream transport is Upstash REST by default; REDIS_TRANSPORT=redis|memory for blocking reads
+redis = create_transport()
+# Poll pacing for non-blocking transports: per-stream cadence, jitter and a shared RPS budget
+poll_scheduler = create_poll_scheduler()
+# One shared multi-key XREAD for all live streams in this process (STREAM_DISPATCHER=0 to disable)
+dispatcher = create_dispatcher(redis, scheduler=poll_scheduler)
+if dispatcher is not None:
+    metrics.metrics.gauge("dispatcher_streams", "Streams the shared dispatcher is reading.", callback=lambda: dispatcher.active_streams)
+# Finished streams, kept as SSE bytes so recovering them never touches the stream again
+stream_cache = TerminalStreamCache(
+    redis,
+    max_bytes=int(os.getenv("STREAM_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+    ttl=float(os.getenv("STREAM_CACHE_TTL", "600")),
+    redis_copy=os.getenv("STREAM_CACHE_REDIS", "0") == "1",
+)
+# TTL on new streams, cleanup after END_OF_STREAM, and the cron sweeper for orphans
+stream_lifecycle = StreamLifecycle(
+    redis,
+    ttl=int(os.getenv("STREAM_TTL", "3600")),
+    retire_on_end=os.getenv("STREAM_RETIRE_ON_END", "1") == "1",
+    retire_grace=int(os.getenv("STREAM_RETIRE_GRACE", "60")),
+    sweep_idle=int(os.getenv("STREAM_SWEEP_IDLE", "3600")),
+    sweep_max_keys=int(os.getenv("STREAM_SWEEP_MAX_KEYS", "2000")),
+)
+# Identical prompts share one backend generation (SINGLEFLIGHT=content|thread, off by default)
+prompt_flights = PromptSingleflight(
+    scope=os.getenv("SINGLEFLIGHT", "off"),
+    ttl=float(os.getenv("SINGLEFLIGHT_TTL", "300")),
+)
+# Async sliding-window limiter on the same transport; blocked clients are rejected in-process.
+# RATELIMIT_LOCAL_ADMIT=1 also admits clients with headroom without waiting on Redis, which
+# loosens the limit: each process admits from its own last view of the window.
+ratelimit = SlidingWindowRateLimiter(
+    redis, max_requests=3, window=10, local_admit=os.getenv("RATELIMIT_LOCAL_ADMIT", "0") == "1",
 )
 backend_url = os.getenv("API_URL")
 backend_api_key = os.getenv("API_KEY")
+# Fails backend triggers fast while the backend is erroring or slow, probing it half-open
+backend_breaker = CircuitBreaker(
+    "backend",
+    window=float(os.getenv("BACKEND_CIRCUIT_WINDOW", "30")),
+    min_calls=int(os.getenv("BACKEND_CIRCUIT_MIN_CALLS", "10")),
+    failure_rate=float(os.getenv("BACKEND_CIRCUIT_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("BACKEND_CIRCUIT_SLOW_SECONDS", "5")),
+    open_seconds=float(os.getenv("BACKEND_CIRCUIT_OPEN_SECONDS", "15")),
+)
+metrics.metrics.gauge("backend_circuit_open", "1 while the backend circuit breaker is open.", callback=lambda: int(backend_breaker.state == OPEN))
+# Per-attempt timeout for the trigger POST, and retries (exponential backoff + jitter) on
+# failures that can't have started a generation; the stream_id makes them idempotent.
+BACKEND_TRIGGER_TIMEOUT = float(os.getenv("BACKEND_TRIGGER_TIMEOUT", "10"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "2"))
+BACKEND_RETRY_MAX_SECONDS = float(os.getenv("BACKEND_RETRY_MAX_SECONDS", "8"))
+# Also retry failures after which the POST may already have reached the backend (read
+# timeouts, dropped connections, 502/504 from a gateway). Off by default, like hedging:
+# only for backends that deduplicate on stream_id / Idempotency-Key.
+BACKEND_RETRY_AMBIGUOUS = os.getenv("BACKEND_RETRY_AMBIGUOUS", "0") == "1"
+# Send a second, identical trigger if the first hasn't answered after this many ms (0 = off).
+# Only for backends that deduplicate on stream_id / Idempotency-Key.
+BACKEND_HEDGE_MS = float(os.getenv("BACKEND_HEDGE_MS", "0"))
+# Statuses that mean the backend turned the request away without starting it
+RETRYABLE_STATUS = {429, 503}
+# Gateway errors: the backend may or may not have received the request
+AMBIGUOUS_STATUS = {502, 504}
+# Failures before the request was sent; anything else may have reached the backend
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
 
 # Cron job configuration
 CRON_SECRET = os.getenv("CRON_SECRET")
 CRON_ALERT_WEBHOOK = os.getenv("CRON_ALERT_WEBHOOK")
-
-
-def sanitize_content(content: str) -> str:
-    """
-    Sanitize user input to prevent injection attacks.
-    Returns the cleaned content or raises ValueError if malicious.
-    """
-    if not content:
-        return content
-    
-    # Convert to lowercase for case-insensitive matching
-    content_lower = content.lower()
-    
-    # Check for various injection patterns
-    dangerous_patterns = [
-        r'<script[^>]*>.*?</script>',  # Script tags
-        r'<iframe[^>]*>.*?</iframe>',  # Iframe tags
-        r'javascript:',                 # JavaScript protocol
-        r'data:text/html',             # Data URLs with HTML
-        r'vbscript:',                  # VBScript protocol
-        r'on\w+\s*=',                  # Event handlers (onclick, onload, etc.)
-        r'<object[^>]*>.*?</object>',  # Object tags
-        r'<embed[^>]*>',               # Embed tags
-        r'<form[^>]*>.*?</form>',      # Form tags
-        r'<input[^>]*>',               # Input tags
-        r'<textarea[^>]*>.*?</textarea>',  # Textarea tags
-        r'<select[^>]*>.*?</select>',  # Select tags
-        r'<button[^>]*>.*?</button>',  # Button tags
-    ]
-    
-    for pattern in dangerous_patterns:
-        if re.search(pattern, content, re.IGNORECASE | re.DOTALL):
-            raise ValueError(f"Potentially malicious content detected: {pattern}")
-    
-    # # Check for suspicious URLs
-    # url_patterns = [
-    #     r'https?://[^\s<>"]*',  # HTTP/HTTPS URLs
-    # ]
-    
-    # for pattern in url_patterns:
-    #     matches = re.findall(pattern, content, re.IGNORECASE)
-    #     for url in matches:
-    #         # Allow common safe domains (customize as needed)
-    #         safe_domains = [
-    #             'github.com', 'stackoverflow.com', 'wikipedia.org',
-    #             'docs.python.org', 'python.org', 'pypi.org'
-    #         ]
-    #         is_safe = any(domain in url.lower() for domain in safe_domains)
-    #         if not is_safe:
-    #             raise ValueError(f"Potentially unsafe URL detected: {url}")
-    
-    # Basic length check
-    if len(content) > 10000:  # 10KB limit
-        raise ValueError("Content too long")
-    
-    return content
-
-
-app = FastAPI()
+# Bearer token for /metrics; without one the endpoint is off (404)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# How long a blocking XREADGROUP waits server-side before returning empty
+STREAM_BLOCK_MS = int(os.getenv("STREAM_BLOCK_MS", "2000"))
+# XACKs are batched per consumer and flushed at this many IDs / this age
+ACK_BATCH_SIZE = int(os.getenv("ACK_BATCH_SIZE", "20"))
+ACK_BATCH_MS = int(os.getenv("ACK_BATCH_MS", "250"))
+# Merge chunks arriving within this many ms into one write (0 = one write per chunk)
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "0"))
+# A client whose send has been blocked this long is cut off (SLOW_CLIENT_POLICY=wait to keep waiting)
+SLOW_CLIENT_TIMEOUT = float(os.getenv("SLOW_CLIENT_TIMEOUT", "10"))
+SLOW_CLIENT_POLICY = os.getenv("SLOW_CLIENT_POLICY", "disconnect")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # No-op unless LAZY_STARTUP=1 deferred Sentry past import time.
+    init_sentry()
+    # Each worker opens its own connections; warm them up before taking traffic.
+    try:
+        await redis.execute(["PING"])
+    except Exception as e:
+        logger.warning("Redis warm-up failed", extra={"transport": redis.name, "error": str(e)})
+    yield
+    # Shared clients live for the whole process; close them on shutdown, after
+    # in-flight streams have drained and their acks/retires have gone out.
+    if dispatcher is not None:
+        await dispatcher.close()
+    await AckBatcher.wait_background()
+    await ratelimit.close()
+    await stream_cache.close()
+    await stream_lifecycle.close()
+    await http_clients.aclose()
+    await redis.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Docker and monitoring."""
-    return {"status": "healthy", "service": "chatraghu-nextjs-api"}
+    return {
+        "status": "healthy",
+        "service": "chatraghu-nextjs-api",
+        "http_pool": http_clients.stats(),
+        "backend_circuit": backend_breaker.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint(request: FastAPIRequest):
+    """Per-process latency histograms and counters in Prometheus text format."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    authorization = request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(metrics.metrics.render(), media_type="text/plain; version=0.0.4")
 
 async def trigger_stream_generation(thread_id: str, stream_id: str, chat_request: dict) -> None:
-    """Triggers the backend to start generating the stream."""
+    """
+    Triggers the backend to start generating the stream.
+
+    Each POST goes through `backend_breaker`, which fails fast with a 503 while
+    the backend is erroring or slow. Failures that can't have started a
+    generation (connect errors and timeouts, pool timeouts, 429/503) are
+    retried with jittered exponential backoff, unless the backend has already
+    written to the stream; ambiguous ones (read timeouts, dropped connections,
+    502/504) only with BACKEND_RETRY_AMBIGUOUS. The stream_id goes along as
+    `Idempotency-Key`, which is what makes those retries, and BACKEND_HEDGE_MS
+    hedging, safe on backends that deduplicate on it.
+    """
     if not backend_url or not backend_api_key:
         raise HTTPException(status_code=500, detail="Backend service not configured.")
     
     headers = {
         "Content-Type": "application/json",
-        "X-API-Key": backend_api_key
+        "X-API-Key": backend_api_key,
+        # Same key on every retry/hedge of this trigger, so the backend can drop duplicates.
+        "Idempotency-Key": stream_id,
     }
     
     # The backend needs both the thread_id for history and a unique stream_id for the Redis key.
@@ -116,17 +196,162 @@ async def trigger_stream_generation(thread_id: str, stream_id: str, chat_request
     
     logger.info("Triggering stream generation on backend", extra={"thread_id": thread_id, "stream_id": stream_id, "request": chat_request})
 
+    attempts = 0
+
+    @backoff.on_exception(
+        backoff.expo,
+        (httpx.RequestError, httpx.HTTPStatusError),
+        max_tries=BACKEND_RETRIES + 1,
+        max_time=BACKEND_RETRY_MAX_SECONDS,
+        giveup=lambda e: not is_retryable_trigger_error(e),
+        jitter=backoff.full_jitter,
+        factor=0.25,
+        on_backoff=lambda details: metrics.backend_trigger_attempts.inc("retry"),
+        logger=None,
+    )
+    async def attempt():
+        nonlocal attempts
+        attempts += 1
+        if attempts > 1 and await stream_started(stream_id):
+            # An earlier attempt reached the backend after all (e.g. only its response was
+            # lost): it is already writing this stream, so don't start a second generation.
+            metrics.backend_trigger_attempts.inc("already_started")
+            logger.info("Backend already writing stream, not retrying", extra={"stream_id": stream_id, "attempt": attempts})
+            return
+        await hedged_backend_post(backend_request, headers)
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(backend_url, json=backend_request, headers=headers, timeout=10)
-            response.raise_for_status()
+        await attempt()
+    except CircuitOpenError as e:
+        metrics.backend_trigger_attempts.inc("circuit_open")
+        logger.warning("Backend circuit open, failing fast", extra={"stream_id": stream_id, "retry_after": round(e.retry_after, 1)})
+        raise HTTPException(status_code=503, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        logger.error("Backend rejected stream generation", extra={"stream_id": stream_id, "status": e.response.status_code, "attempts": attempts})
+        raise HTTPException(status_code=502, detail=f"Backend returned {e.response.status_code}")
     except httpx.RequestError as e:
-        logger.exception("Could not trigger stream generation on backend", extra={"error": str(e)})
+        logger.exception("Could not trigger stream generation on backend", extra={"error": str(e), "attempts": attempts})
         raise HTTPException(status_code=502, detail=f"Failed to connect to backend service: {e}")
 
+
+def is_retryable_trigger_error(error: Exception) -> bool:
+    """Failures that can't have started a generation, plus ambiguous ones with BACKEND_RETRY_AMBIGUOUS."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in RETRYABLE_STATUS or (BACKEND_RETRY_AMBIGUOUS and status in AMBIGUOUS_STATUS)
+    if isinstance(error, UNSENT_ERRORS):
+        return True
+    return BACKEND_RETRY_AMBIGUOUS and isinstance(error, httpx.TransportError)
+
+
+async def stream_started(stream_id: str) -> bool:
+    """True if the backend has written to this stream, i.e. a generation is already running."""
+    try:
+        return bool(await redis.execute(["EXISTS", f"stream:{stream_id}"]))
+    except Exception as e:
+        # Can't tell; a retry is still better than failing the chat outright.
+        logger.warning("Could not check for an existing stream", extra={"stream_id": stream_id, "error": str(e)})
+        return False
+
+
+async def backend_post(backend_request: dict, headers: dict) -> None:
+    """One trigger POST through the circuit breaker."""
+    backend_breaker.before_call()
+    started = time.monotonic()
+    try:
+        # Pooled keep-alive client, so only the first message pays the TCP/TLS handshake.
+        client = http_clients.client("backend")
+        response = await client.post(backend_url, json=backend_request, headers=headers, timeout=BACKEND_TRIGGER_TIMEOUT)
+        response.raise_for_status()
+    except asyncio.CancelledError:
+        backend_breaker.cancel()
+        raise
+    except httpx.HTTPStatusError as e:
+        # 4xx means the request was wrong, not that the backend is unhealthy.
+        backend_breaker.record(time.monotonic() - started, failed=e.response.status_code == 429 or e.response.status_code >= 500)
+        metrics.backend_trigger_attempts.inc("error")
+        raise
+    except Exception:
+        # Transport errors, but also anything unexpected (a bad URL, a body that
+        # doesn't serialize): every call let through must report back, or a
+        # half-open probe slot is never released.
+        backend_breaker.record(time.monotonic() - started, failed=True)
+        metrics.backend_trigger_attempts.inc("error")
+        raise
+    backend_breaker.record(time.monotonic() - started, failed=False)
+    metrics.backend_trigger_attempts.inc("ok")
+
+
+async def hedged_backend_post(backend_request: dict, headers: dict) -> None:
+    """
+    `backend_post`, plus (with BACKEND_HEDGE_MS) a second identical POST if the
+    first is still waiting after that long. Whichever succeeds first wins and the
+    other is cancelled; if both fail, the first error is raised.
+    """
+    if BACKEND_HEDGE_MS <= 0:
+        await backend_post(backend_request, headers)
+        return
+
+    primary = asyncio.create_task(backend_post(backend_request, headers))
+    done, _ = await asyncio.wait({primary}, timeout=BACKEND_HEDGE_MS / 1000)
+    if done:
+        return primary.result()
+    if backend_breaker.state != CLOSED:
+        # No hedging while the breaker is limiting calls; just wait for the first one.
+        return await primary
+    metrics.backend_trigger_attempts.inc("hedge")
+    hedge = asyncio.create_task(backend_post(backend_request, headers))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def get_group_cursor(stream_key: str, group_name: str) -> str:
+    """Returns the consumer group's last-delivered-id, i.e. where live reads should resume."""
+    try:
+        groups = await redis.execute(["XINFO", "GROUPS", stream_key])
+        for group in groups or []:
+            info = dict(zip(group[::2], group[1::2]))
+            if info.get("name") == group_name:
+                return info.get("last-delivered-id", "0-0")
+    except Exception as e:
+        logger.warning("Could not read consumer group cursor", extra={"stream_key": stream_key, "error": str(e)})
+    return "0-0"
+
+async def get_replay_cursor(stream_key: str, group_name: str):
+    """
+    Where a recovery should resume, as (message_id, inclusive): from the oldest
+    entry still pending for the group, else right after its last-delivered-id.
+    """
+    try:
+        groups, pending = await redis.pipeline([
+            ["XINFO", "GROUPS", stream_key],
+            ["XPENDING", stream_key, group_name],
+        ])
+        # Parsed in here too: an unexpected reply shape shouldn't fail the recovery.
+        if pending and pending[0] and int(pending[0]) > 0:
+            return pending[1], True
+        for group in groups or []:
+            info = dict(zip(group[::2], group[1::2]))
+            if info.get("name") == group_name:
+                return info.get("last-delivered-id"), False
+    except Exception as e:
+        logger.warning("Could not read replay cursor", extra={"stream_key": stream_key, "error": str(e)})
+    return None, False
+
 async def consume_stream_from_redis(stream_id: str):
     """Consumes chunks from a Redis stream for a given stream_id and yields them."""
-    stream_key = f"stream:{stream_id}"
+    # Singleflight followers read their leader's stream through their own group.
+    source_id = source_stream_id(stream_id)
+    stream_key = f"stream:{source_id}"
     # The consumer and group should also be tied to the unique stream_id
     consumer_name = f"consumer:{stream_id}"
     group_name = f"group:{stream_id}"
@@ -134,6 +359,8 @@ async def consume_stream_from_redis(stream_id: str):
     try:
         # Create a unique consumer group for this session.
         await redis.execute(["XGROUP", "CREATE", stream_key, group_name, "0", "MKSTREAM"])
+        # New group (and maybe a brand-new stream via MKSTREAM): make sure it can't outlive its TTL.
+        await stream_lifecycle.on_created(stream_key)
     except Exception as e:
         # If the group already exists, it's not a critical error.
         if "BUSYGROUP" not in str(e):
@@ -150,130 +377,278 @@ async def consume_stream_from_redis(stream_id: str):
     # listen for new messages.
     last_processed_id = "0-0"
     
-    # For latency optimization
-    poll_interval = 0.1  # Start with 100ms polling
-    max_poll_interval = 2.0  # Max 2s between polls
-    consecutive_empty_reads = 0
-    start_time = datetime.datetime.now()
+    # Paces live polls when reads can't block server-side (Upstash without the dispatcher)
+    poll_schedule = poll_scheduler.stream()
+    last_data_at = time.monotonic()
     max_idle_time = 15  # 15 seconds of no data
  
 
-    while True:
-        try:
-            # Non-blocking XREADGROUP (no BLOCK parameter for Upstash compatibility)
-            response = await redis.execute([
-                "XREADGROUP", "GROUP", group_name, consumer_name, 
-                "COUNT", "10", "STREAMS", stream_key, last_processed_id
-            ])
-            
-            logger.debug("XREADGROUP response", extra={
-                "stream_id": stream_id, 
-                "response": response, 
-                "last_processed_id": last_processed_id
-            })
-
-            # Check if we got any data
-            has_data = (response and len(response) > 0 and 
-                       len(response[0]) >= 2 and response[0][1] and len(response[0][1]) > 0)
-            if has_data:
-                start_time = datetime.datetime.now()
-                        
-            if not has_data:
-                if last_processed_id == "0-0":
-                    # No pending messages, switch to listening for new ones
-                    last_processed_id = ">"
-                    logger.debug("No pending messages, switching to listen for new messages", extra={"stream_id": stream_id})
-                    # Reset polling interval for new message mode
-                    poll_interval = 0.1
-                    consecutive_empty_reads = 0
-                    continue
-                else:
-                    # No new messages, implement adaptive polling
-                    consecutive_empty_reads += 1
-                    
-                    # Exponential backoff: increase polling interval when no data
-                    if consecutive_empty_reads > 5:  # After 5 empty reads
-                        poll_interval = min(poll_interval * 1.5, max_poll_interval)
-                    
-                    # Timeout after 15 seconds of no data, greater than client's 12sec timeout.
-                    elapsed_time = datetime.datetime.now() - start_time
-                    if elapsed_time.total_seconds() > max_idle_time:
-                        logger.info("Stream timeout reached, ending consumption", extra={"stream_id": stream_id})
-                        
-                        yield f"data: [Stream timeout: No response from AI]\n\n"
-                        yield f"data: [END_OF_STREAM]\n\n"
+    # Timing for metrics; perf_counter is cheap enough to call per chunk.
+    consumer_started = time.perf_counter()
+    last_chunk_at = None
+    end_reason = "disconnect"
+    last_yielded_id = None
+    cached = None
+    metrics.active_streams.inc()
+
+    subscription = None
+    acks = AckBatcher(redis, stream_key, group_name, max_batch=ACK_BATCH_SIZE, max_delay=ACK_BATCH_MS / 1000)
+    try:
+        while True:
+            if drain.expired():
+                # This worker is shutting down: hand the client over to /api/recover
+                # instead of being cut off. What was yielded is acked below (lifespan
+                # waits for it); the rest is replayed by whichever instance answers.
+                logger.info("Draining stream, sending recover hint", extra={"stream_id": stream_id})
+                end_reason = "drain"
+                yield recover_hint(stream_id)
+                return
+            try:
+                if dispatcher is not None and last_processed_id == ">":
+                    # Pending entries are drained; live entries come from the shared
+                    # dispatcher, starting where this consumer group left off.
+                    if subscription is None:
+                        subscription = dispatcher.subscribe(
+                            stream_key, await get_group_cursor(stream_key, group_name)
+                        )
+                    read_mode = "dispatcher"
+                    messages = await subscription.get(timeout=STREAM_BLOCK_MS / 1000)
+                    if not messages and subscription.overflowed:
+                        # Fell too far behind (SLOW_CLIENT_POLICY=disconnect): the dispatcher
+                        # dropped us. The group cursor is saved on release, so /api/recover
+                        # picks up right after what this client got.
+                        logger.info("Stream subscriber overflowed, sending recover hint", extra={"stream_id": stream_id})
+                        end_reason = "slow"
+                        yield recover_hint(stream_id)
                         return
-                    
-                    logger.debug("No new messages, sleeping", extra={
+                    response = [[stream_key, messages]] if messages else None
+                else:
+                    # Blocking transports wait server-side for new entries; Upstash REST has
+                    # no BLOCK support, so there live reads are paced by the poll scheduler.
+                    # Any batched XACKs go out in the same round-trip as the read.
+                    read_mode = "live" if last_processed_id == ">" else "pending"
+                    if read_mode == "live" and not redis.blocking:
+                        await poll_schedule.wait()
+                    response = await acks.read_group(redis.read_group_command(
+                        group_name, consumer_name, stream_key, last_processed_id,
+                        count=10,
+                        block_ms=STREAM_BLOCK_MS if last_processed_id == ">" else None,
+                    ))
+            
+                if stream_logger.isEnabledFor(logging.DEBUG):
+                    stream_logger.debug("XREADGROUP response", extra={
                         "stream_id": stream_id, 
-                        "poll_interval": poll_interval,
-                        "consecutive_empty_reads": consecutive_empty_reads
+                        "response": response, 
+                        "last_processed_id": last_processed_id
                     })
-                    
-                    import asyncio
-                    await asyncio.sleep(poll_interval)
-                    continue  # This is the key - continue the loop to call XREADGROUP again
-            
-            # We got data! Reset polling optimizations
-            poll_interval = 0.1
-            consecutive_empty_reads = 0
-            
-            # Parse the response structure: [[stream_key, [[message_id, [field, value, ...]], ...]]]
-            stream_name, messages = response[0]
-
-            logger.debug("Processing messages", extra={"stream_id": stream_id, "message_count": len(messages)})
 
-            for message_entry in messages:
-                if len(message_entry) < 2:
-                    continue
+                # Check if we got any data
+                has_data = (response and len(response) > 0 and 
+                           len(response[0]) >= 2 and response[0][1] and len(response[0][1]) > 0)
+                metrics.stream_reads.inc(read_mode)
+                if has_data:
+                    last_data_at = time.monotonic()
+                    poll_schedule.on_data(parse_entry_id(response[0][1][-1][0])[0], len(response[0][1]))
+                        
+                if not has_data:
+                    metrics.stream_empty_reads.inc(read_mode)
+                    if last_processed_id != ">":
+                        # No (more) pending messages, switch to listening for new ones
+                        last_processed_id = ">"
+                        stream_logger.debug("No pending messages, switching to listen for new messages", extra={"stream_id": stream_id})
+                        continue
+                    else:
+                        # Timeout after 15 seconds of no data, greater than client's 12sec timeout.
+                        if time.monotonic() - last_data_at > max_idle_time:
+                            logger.info("Stream timeout reached, ending consumption", extra={"stream_id": stream_id})
+                            end_reason = "timeout"
+                            prompt_flights.finish(stream_id, completed=False)
+                        
+                            yield sse.STREAM_TIMEOUT_EVENT
+                            yield sse.END_OF_STREAM_EVENT
+                            return
+
+                        # Blocking reads already waited STREAM_BLOCK_MS; polled ones back off
+                        # and the next read waits for the stream's next poll slot.
+                        poll_schedule.on_empty()
+                        if stream_logger.isEnabledFor(logging.DEBUG):
+                            stream_logger.debug("No new messages", extra={
+                                "stream_id": stream_id, 
+                                "poll_interval": poll_schedule.interval,
+                            })
+                        continue  # This is the key - continue the loop to call XREADGROUP again
+            
+                # Parse the response structure: [[stream_key, [[message_id, [field, value, ...]], ...]]]
+                stream_name, messages = response[0]
+
+                stream_logger.debug("Processing messages", extra={"stream_id": stream_id, "message_count": len(messages)})
+
+                # Everything from one read goes out as a single write: the events
+                # are framed into one bytes buffer and acked together afterwards.
+                events = []
+                delivered = []
+                ended = False
+                for message_entry in messages:
+                    if len(message_entry) < 2:
+                        continue
                     
-                message_id = message_entry[0]
-                field_value_pairs = message_entry[1]
+                    message_id = message_entry[0]
+                    field_value_pairs = message_entry[1]
+
+                    now = time.perf_counter()
+                    if last_chunk_at is None:
+                        metrics.stream_first_chunk_seconds.observe(now - consumer_started)
+                    else:
+                        metrics.stream_chunk_gap_seconds.observe(now - last_chunk_at)
+                    last_chunk_at = now
                 
-                # Parse field-value pairs: [field1, value1, field2, value2, ...]
-                data = {}
-                for i in range(0, len(field_value_pairs), 2):
-                    if i + 1 < len(field_value_pairs):
-                        field = field_value_pairs[i]
-                        value = field_value_pairs[i + 1]
-                        data[field] = value
-                
-                chunk = data.get('chunk')
-                if chunk == "[END_OF_STREAM]":
-                    logger.info("End of stream marker received from Redis", extra={"stream_id": stream_id})
-
-                    yield b"data: [END_OF_STREAM]\n\n"                    
-                    await redis.execute(["XACK", stream_key, group_name, message_id])
+                    # Legacy `chunk` entries or version 1 batches, framed straight into SSE bytes.
+                    try:
+                        event, data_frames, entry_ended = chunk_protocol.entry_events(field_value_pairs, message_id)
+                    except chunk_protocol.ChunkProtocolError as e:
+                        logger.warning("Skipping malformed stream entry", extra={"stream_id": stream_id, "message_id": message_id, "error": str(e)})
+                        event, data_frames, entry_ended = b"", 0, False
+                    delivered.append(message_id)
+                    if event:
+                        events.append(event)
+                    if data_frames:
+                        metrics.stream_chunks.inc(amount=data_frames)
+                    if entry_ended:
+                        logger.info("End of stream marker received from Redis", extra={"stream_id": stream_id})
+                        # Keep the finished stream around so recovering it is a cache hit.
+                        cached = stream_cache.materialize_in_background(source_id)
+                        prompt_flights.finish(stream_id, completed=True)
+                        ended = True
+                        break
+
+                if events:
+                    yield events[0] if len(events) == 1 else b"".join(events)
+                if delivered:
+                    last_yielded_id = delivered[-1]
+
+                # Acknowledge the messages *after* we have successfully yielded them to the client.
+                # Acks are batched; a big batch or an old one is flushed without waiting for the next read.
+                # Dispatcher entries were read with XREAD, so they never entered the pending list.
+                if subscription is None:
+                    for message_id in delivered:
+                        acks.add(message_id)
+                    if ended or acks.due:
+                        await acks.flush()
+                elif delivered:
+                    subscription.mark_delivered(delivered[-1])
+                    dispatcher.checkpoint(subscription, group_name)
+                if ended:
+                    end_reason = "end"
                     return
-            
-                if chunk:
-                                        
-                    # This is the key SSE formatting fix.
-                    # It must be `data: ...` and end with two newlines.
-                    message_data = chunk
-                    if not isinstance(message_data, str):
-                        message_data = message_data.decode('utf-8')
-                    
-                    sse_message = f"data: {message_data}\n\n"
-                    yield sse_message.encode('utf-8')
-
-                # Acknowledge the message *after* we have successfully yielded it to the client.
-                await redis.execute(["XACK", stream_key, group_name, message_id])
                 
                 # If we were processing pending messages, we update the ID to continue
                 # from this point in the pending list.
-                if last_processed_id != ">":
-                    last_processed_id = message_id
-
-        except Exception as e:
-            logger.error("Error in consume_stream_from_redis", extra={
-                "stream_id": stream_id, 
-                "error": str(e), 
-                "error_type": type(e).__name__
-            })
-            # Small delay to prevent tight error loops
-            import asyncio
-            await asyncio.sleep(1)
+                if last_processed_id != ">" and delivered:
+                    last_processed_id = delivered[-1]
+
+            except Exception as e:
+                metrics.stream_errors.inc(type(e).__name__)
+                logger.error("Error in consume_stream_from_redis", extra={
+                    "stream_id": stream_id, 
+                    "error": str(e), 
+                    "error_type": type(e).__name__
+                })
+                # Small delay to prevent tight error loops
+                await asyncio.sleep(1)
+    finally:
+        if last_yielded_id is not None:
+            stream_cache.note_delivered(stream_id, last_yielded_id)
+        metrics.active_streams.dec()
+        metrics.stream_duration_seconds.observe(time.perf_counter() - consumer_started, end_reason)
+        if end_reason == "end" and stream_lifecycle.retire_on_end:
+            # Everything was delivered: the group and the stream can go (after caching it).
+            if subscription is not None:
+                dispatcher.release(subscription)
+            stream_lifecycle.retire_in_background(stream_key, group_name, after=cached)
+        else:
+            # Client disconnected or timed out: don't leave yielded chunks pending.
+            acks.flush_in_background()
+            if subscription is not None:
+                dispatcher.release(subscription, group_name)
+
+
+async def consume_stream_after(stream_id: str, last_event_id: str):
+    """
+    Stateless resume for clients that send `Last-Event-ID`: reads the stream
+    from just after that entry with plain XREAD.
+    No consumer group, pending list or acks, so what is replayed is exactly
+    what the client hasn't seen, no matter which process served it before.
+    """
+    stream_key = f"stream:{source_stream_id(stream_id)}"
+    logger.info("Resuming stream from Last-Event-ID", extra={"stream_id": stream_id, "last_event_id": last_event_id})
+
+    cursor = last_event_id
+    poll_schedule = poll_scheduler.stream()
+    last_data_at = time.monotonic()
+    max_idle_time = 15  # same idle timeout as consume_stream_from_redis
+    consumer_started = time.perf_counter()
+    end_reason = "disconnect"
+    metrics.active_streams.inc()
+    try:
+        while True:
+            if drain.expired():
+                end_reason = "drain"
+                yield recover_hint(stream_id)
+                return
+            try:
+                # Its own XREAD rather than the shared dispatcher: the cursor is exactly
+                # the client's, and nothing else decides what this read returns.
+                read_mode = "offset"
+                command = ["XREAD", "COUNT", "10"]
+                if redis.blocking:
+                    command += ["BLOCK", str(STREAM_BLOCK_MS)]
+                else:
+                    await poll_schedule.wait()
+                response = await redis.execute(command + ["STREAMS", stream_key, cursor])
+                messages = response[0][1] if response else []
+            except Exception as e:
+                metrics.stream_errors.inc(type(e).__name__)
+                logger.error("Error in consume_stream_after", extra={"stream_id": stream_id, "error": str(e), "error_type": type(e).__name__})
+                await asyncio.sleep(1)
+                continue
+
+            metrics.stream_reads.inc(read_mode)
+            if not messages:
+                metrics.stream_empty_reads.inc(read_mode)
+                if time.monotonic() - last_data_at > max_idle_time:
+                    logger.info("Stream timeout reached, ending consumption", extra={"stream_id": stream_id})
+                    end_reason = "timeout"
+                    yield sse.STREAM_TIMEOUT_EVENT
+                    yield sse.END_OF_STREAM_EVENT
+                    return
+                poll_schedule.on_empty()
+                continue
+
+            last_data_at = time.monotonic()
+            poll_schedule.on_data(parse_entry_id(messages[-1][0])[0], len(messages))
+            events = []
+            ended = False
+            for message_id, fields in messages:
+                try:
+                    event, data_frames, ended = chunk_protocol.entry_events(fields, message_id)
+                except chunk_protocol.ChunkProtocolError as e:
+                    logger.warning("Skipping malformed stream entry", extra={"stream_id": stream_id, "message_id": message_id, "error": str(e)})
+                    continue
+                if event:
+                    events.append(event)
+                if data_frames:
+                    metrics.stream_chunks.inc(amount=data_frames)
+                if ended:
+                    break
+            cursor = message_id
+            if events:
+                yield b"".join(events)
+            if ended:
+                end_reason = "end"
+                return
+    finally:
+        metrics.active_streams.dec()
+        metrics.stream_duration_seconds.observe(time.perf_counter() - consumer_started, end_reason)
 
 
 @app.post("/api/chat")
@@ -282,16 +657,19 @@ async def handle_chat_data(fastapi_request: FastAPIRequest):
     client_host = fastapi_request.client.host if fastapi_request.client else "unknown"
     identifier = f"ratelimit:{client_host}"
     
-    # fail-open if upstash_ratelimit check fails
-    # run in threadpool to avoid blocking the event loop
+    # fail-open if the ratelimit check fails
+    phase_started = time.perf_counter()
     try:
-        result = await run_in_threadpool(ratelimit.limit, identifier)
-        success = result[0] if isinstance(result, (list, tuple)) else result
+        result = await ratelimit.limit(identifier)
+        success = result.allowed
+        metrics.ratelimit_seconds.observe(time.perf_counter() - phase_started, "local" if result.local else "redis")
     except Exception as e:
         logger.exception("Ratelimit check failed, allowing request", extra={"error": str(e)})
+        metrics.ratelimit_seconds.observe(time.perf_counter() - phase_started, "error")
         success = True # fail-open
 
     if not success:
+        metrics.chat_requests.inc("rate_limited")
         raise HTTPException(status_code=429, detail="Rate limit exceeded.")
 
     # 2. Extract request, generate a UNIQUE stream_id for this request.
@@ -300,8 +678,11 @@ async def handle_chat_data(fastapi_request: FastAPIRequest):
         content = sanitize_content(chat_request.get("content", ""))
     except ValueError as e:
         # Graceful handling of malicious content
+        metrics.chat_requests.inc("rejected")
+        # `e` is unbound once the except block ends, so capture the message now.
+        error_message = str(e)
         async def sanitization_error_stream():
-            yield f"data: [Error: {str(e)}]\n\n"
+            yield f"data: [Error: {error_message}]\n\n"
             yield "data: [END_OF_STREAM]\n\n"
         
         return StreamingResponse(
@@ -309,8 +690,9 @@ async def handle_chat_data(fastapi_request: FastAPIRequest):
             media_type="text/event-stream",
             headers={'Cache-Control': 'no-cache'}
         )
-    except Exception as e:
+    except Exception:
         # Graceful handling of JSON parsing errors
+        metrics.chat_requests.inc("invalid_request")
         async def json_error_stream():
             yield "data: [Error: Invalid request format]\n\n"
             yield "data: [END_OF_STREAM]\n\n"
@@ -324,18 +706,38 @@ async def handle_chat_data(fastapi_request: FastAPIRequest):
   
   
     thread_id = chat_request.get("thread_id") # Keep existing thread_id for history
+
+    # Same prompt already generating (or just finished)? Follow that stream instead.
+    flight_key = prompt_flights.key(content, thread_id)
+    flight = prompt_flights.lookup(flight_key)
+    if flight is not None:
+        source_id, completed = flight
+        if not completed or stream_cache.get(source_id) is not None:
+            return follow_existing_stream(fastapi_request, source_id)
+
     stream_id = str(uuid.uuid4()) # Generate a new, unique ID for this specific stream
 
     backend_request = {
         "content": content,
     }
 
+    # Registered before the trigger goes out, so duplicates arriving while it's
+    # in flight follow this stream instead of calling the backend themselves.
+    prompt_flights.start(flight_key, stream_id)
+
     # 3. Trigger the backend to start generation.
+    phase_started = time.perf_counter()
     try:    
         await trigger_stream_generation(thread_id, stream_id, backend_request)
+        metrics.backend_trigger_seconds.observe(time.perf_counter() - phase_started, "ok")
     except HTTPException as e:
+        metrics.backend_trigger_seconds.observe(time.perf_counter() - phase_started, "error")
+        metrics.chat_requests.inc("backend_error")
+        # `e` is unbound once the except block ends, so capture the detail now.
+        detail = e.detail
+        await abandon_flight(flight_key, stream_id, detail)
         async def error_stream():
-            yield f"data: [Backend service unavailable]:{e.detail}\n\n"
+            yield f"data: [Backend service unavailable]:{detail}\n\n"
             yield "data: [END_OF_STREAM]\n\n"
 
         return StreamingResponse(
@@ -347,7 +749,15 @@ async def handle_chat_data(fastapi_request: FastAPIRequest):
                 'X-Accel-Buffering': 'no'
             }
         )
+    except BaseException:
+        # Anything else (a bug, the request being cancelled) still propagates, but
+        # the flight must not outlive it: followers would wait on a stream nobody writes.
+        metrics.backend_trigger_seconds.observe(time.perf_counter() - phase_started, "error")
+        await abandon_flight(flight_key, stream_id, "Internal error")
+        raise
     
+    metrics.chat_requests.inc("streamed")
+
     # 4. Return a streaming response that consumes from the unique stream_id
     #    and includes the stream_id in a header for client-side recovery.
     headers = {
@@ -356,28 +766,117 @@ async def handle_chat_data(fastapi_request: FastAPIRequest):
         'X-Accel-Buffering': 'no',
         'X-Stream-Id': stream_id # Custom header to send the ID to the client
     }
-    return StreamingResponse(
-        consume_stream_from_redis(stream_id),
-        media_type='text/event-stream',
+    return client_stream(
+        fastapi_request,
+        sse.coalesce(consume_stream_from_redis(stream_id), SSE_COALESCE_MS / 1000),
         headers=headers,
         background=BackgroundTask(lambda: logger.info("Streaming response completed", extra={"stream_id": stream_id}))
     )
 
+def client_stream(request: FastAPIRequest, content, headers: dict, background=None) -> StreamingResponse:
+    """SSE response that ends (and releases its Redis reads) as soon as the client leaves or stalls."""
+    return ClientStreamingResponse(
+        content,
+        request=request,
+        stall_timeout=SLOW_CLIENT_TIMEOUT,
+        slow_client_policy=SLOW_CLIENT_POLICY,
+        media_type='text/event-stream',
+        headers=headers,
+        background=background,
+    )
+
+async def abandon_flight(flight_key: Optional[str], stream_id: str, detail) -> None:
+    """
+    Drops a flight whose backend trigger failed. Followers that attached in the
+    meantime are reading a stream nobody will write to, so it gets an error
+    entry that ends them now rather than at the idle timeout.
+    """
+    if flight_key is None:
+        return
+    prompt_flights.finish(stream_id, completed=False)
+    stream_key = f"stream:{stream_id}"
+    try:
+        await redis.pipeline([
+            ["XADD", stream_key, "*", *chunk_protocol.batch_fields(error=f"Backend service unavailable: {detail}", end=True)],
+            ["EXPIRE", stream_key, str(stream_lifecycle.ttl)],
+        ])
+    except Exception as e:
+        logger.warning("Could not end followers of a failed stream", extra={"stream_id": stream_id, "error": str(e)})
+
+def follow_existing_stream(request: FastAPIRequest, source_id: str) -> StreamingResponse:
+    """
+    Serves a duplicate prompt from the stream of the request that asked it first:
+    straight from the completed-stream cache if it's done, otherwise through a
+    consumer group of its own on that stream. No backend call either way.
+    """
+    stream_id = follower_stream_id(source_id)
+    logger.info("Prompt coalesced onto existing stream", extra={"stream_id": stream_id, "source_id": source_id})
+
+    async def follow():
+        # Checked when the body starts, so a leader that finished (and retired
+        # its stream) in the meantime is still served from the cache.
+        cached = stream_cache.get(source_id)
+        if cached is not None:
+            metrics.chat_requests.inc("replayed")
+            yield cached.replay()
+            stream_cache.note_delivered(stream_id, cached.entries[-1][0])
+            return
+        metrics.chat_requests.inc("coalesced")
+        async with contextlib.aclosing(consume_stream_from_redis(stream_id)) as events:
+            async for event in events:
+                yield event
+
+    headers = {
+        'Cache-Control': 'no-cache, no-transform',
+        'Connection': 'close',
+        'X-Accel-Buffering': 'no',
+        'X-Stream-Id': stream_id
+    }
+    return client_stream(request, sse.coalesce(follow(), SSE_COALESCE_MS / 1000), headers)
+
 @app.get("/api/recover/{stream_id}")
-async def recover_chat_stream(stream_id: str):
+async def recover_chat_stream(stream_id: str, request: FastAPIRequest):
     """
     Allows a client to recover a stream using its unique stream_id.
     """
     logger.info("Recovery request received", extra={"stream_id": stream_id})
-    return StreamingResponse(
-        consume_stream_from_redis(stream_id),
-        media_type="text/event-stream",
-        headers={
-            'Cache-Control': 'no-cache, no-transform',
-            'Connection': 'close',
-            'X-Accel-Buffering': 'no'
-        }
-    )
+    headers = {
+        'Cache-Control': 'no-cache, no-transform',
+        'Connection': 'close',
+        'X-Accel-Buffering': 'no'
+    }
+
+    # Clients that kept the SSE `id:` of the last event they got say so; resuming
+    # right after it needs no consumer group state at all.
+    last_event_id = request.headers.get("last-event-id") or None
+    if last_event_id is not None:
+        try:
+            parse_entry_id(last_event_id)
+        except ValueError:
+            logger.warning("Ignoring malformed Last-Event-ID", extra={"stream_id": stream_id, "last_event_id": last_event_id})
+            last_event_id = None
+
+    # Finished streams are served from the terminal cache: no consumer group,
+    # no polling, just the part of the answer the client hasn't seen yet.
+    source_id = source_stream_id(stream_id)
+    completed = await stream_cache.lookup(source_id)
+    if completed is not None:
+        cursor, inclusive = last_event_id or stream_cache.delivered_cursor(stream_id), False
+        if cursor is None:
+            cursor, inclusive = await get_replay_cursor(f"stream:{source_id}", f"group:{stream_id}")
+        logger.info("Recovery served from completed-stream cache", extra={"stream_id": stream_id, "cursor": cursor})
+        payload = completed.replay(cursor, inclusive) or sse.END_OF_STREAM_EVENT
+
+        async def cached_stream():
+            yield payload
+
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=headers)
+
+    if last_event_id is not None:
+        events = consume_stream_after(stream_id, last_event_id)
+    else:
+        events = consume_stream_from_redis(stream_id)
+    return client_stream(request, sse.coalesce(events, SSE_COALESCE_MS / 1000), headers)
 
 @app.get("/api/cron/keep_alive")
 async def cron_keep_alive(request: FastAPIRequest):
@@ -412,28 +911,42 @@ async def cron_keep_alive(request: FastAPIRequest):
         await redis.execute(["SET", key, timestamp, "EX", "604800"])
         
         logger.info("Redis keep-alive successful", extra={"timestamp": timestamp})
-        return {
-            "status": "healthy", 
-            "timestamp": timestamp, 
-            "message": "Upstash activity recorded"
-        }
-        
     except Exception as e:
         logger.exception("Redis keep-alive failed", extra={"error": str(e)})
-        
-        # Optional: Send alert to webhook
-        if CRON_ALERT_WEBHOOK:
-            try:
-                async with httpx.AsyncClient(timeout=5) as client:
-                    await client.post(
-                        CRON_ALERT_WEBHOOK,
-                        json={
-                            "event": "redis_keep_alive_failed",
-                            "error": str(e),
-                            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                        },
-                    )
-            except Exception as alert_error:
-                logger.warning("Alert webhook failed", extra={"hook_error": str(alert_error)})
-        
+        await send_cron_alert("redis_keep_alive_failed", e)
         raise HTTPException(status_code=500, detail="Keep-alive failed")
+
+    # 3. Garbage-collect orphaned streams; a failed sweep doesn't fail the keep-alive.
+    try:
+        sweep = await stream_lifecycle.sweep()
+        logger.info("Stream sweep finished", extra=sweep)
+    except Exception as e:
+        logger.exception("Stream sweep failed", extra={"error": str(e)})
+        await send_cron_alert("stream_sweep_failed", e)
+        sweep = {"error": str(e)}
+
+    return {
+        "status": "healthy", 
+        "timestamp": timestamp, 
+        "message": "Upstash activity recorded",
+        "sweep": sweep,
+    }
+
+
+async def send_cron_alert(event: str, error: Exception) -> None:
+    """Posts a cron failure to CRON_ALERT_WEBHOOK, if configured."""
+    if not CRON_ALERT_WEBHOOK:
+        return
+    try:
+        await http_clients.client("alerts").post(
+            CRON_ALERT_WEBHOOK,
+            json={
+                "event": event,
+                "error": str(error),
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
+            },
+            timeout=5,
+        )
+    except Exception as alert_error:
+        logger.warning("Alert webhook failed", extra={"hook_error": str(alert_error)})
+
@@ -0,0 +1,131 @@
+"""
+Stream entry formats between the backend (producer) and the proxy (consumer).
+
+Legacy entries carry one token per entry in a `chunk` field, with the
+literal `[END_OF_STREAM]` as the last one. Version 1 entries carry a batch
+of frames in a single `b` field, so a whole burst of tokens costs one XADD,
+one read slot and one XACK:
+
+    payload := VERSION frame*          VERSION is "1"
+    frame   := TYPE LENGTH ":" BODY    TYPE is one byte, LENGTH the BODY size
+                                       in UTF-8 bytes, as ASCII digits
+    TYPE    := "D" data | "E" end | "X" error | "H" heartbeat
+
+e.g. XADD stream:{id} * b "1D5:HelloD6: worldE0:". Everything stays valid
+UTF-8 text, so it passes through Upstash REST and `decode_responses`
+clients unchanged. A consumer reads both formats; producers can switch
+whenever they like.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+from api.utils import sse
+
+LEGACY_FIELD = "chunk"
+BATCH_FIELD = "b"
+VERSION = b"1"
+
+DATA = ord("D")
+END = ord("E")
+ERROR = ord("X")
+HEARTBEAT = ord("H")
+FRAME_TYPES = frozenset((DATA, END, ERROR, HEARTBEAT))
+
+Frame = Tuple[int, bytes]
+
+
+class ChunkProtocolError(ValueError):
+    """A stream entry that doesn't parse; the consumer skips it."""
+
+
+def decode_frames(payload: Union[str, bytes]) -> List[Frame]:
+    """Splits a version 1 payload into (type, body) frames."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if payload[:1] != VERSION:
+        raise ChunkProtocolError(f"unsupported entry version {payload[:1]!r}")
+    frames = []
+    position, size = 1, len(payload)
+    while position < size:
+        colon = payload.find(b":", position + 1)
+        if colon < 0:
+            raise ChunkProtocolError("truncated frame header")
+        if payload[position] not in FRAME_TYPES:
+            raise ChunkProtocolError(f"unknown frame type {payload[position:position + 1]!r}")
+        # int() alone would take "-4", "+4", " 4" or "4_0"; a negative length
+        # would move `position` backwards and loop forever.
+        digits = payload[position + 1:colon]
+        if not digits or not digits.isdigit():
+            raise ChunkProtocolError("bad frame length")
+        end = colon + 1 + int(digits)
+        if end <= position or end > size:
+            raise ChunkProtocolError("truncated frame body")
+        frames.append((payload[position], payload[colon + 1:end]))
+        position = end
+    return frames
+
+
+def encode_frames(frames: Iterable[Tuple[int, Union[str, bytes]]]) -> str:
+    """Builds a version 1 payload (as text, ready for XADD) from (type, body) frames."""
+    parts = [VERSION.decode()]
+    for kind, body in frames:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        parts.append(f"{chr(kind)}{len(body.encode('utf-8'))}:{body}")
+    return "".join(parts)
+
+
+def batch_fields(tokens: Sequence[str] = (), end: bool = False, error: Optional[str] = None) -> List[str]:
+    """XADD field/value list for one batch: the tokens, then an error and/or end frame."""
+    frames = [(DATA, token) for token in tokens]
+    if error is not None:
+        frames.append((ERROR, error))
+    if end:
+        frames.append((END, ""))
+    return [BATCH_FIELD, encode_frames(frames)]
+
+
+def entry_events(fields: Sequence, entry_id: Optional[str] = None) -> Tuple[bytes, int, bool]:
+    """
+    SSE bytes for one stream entry in either format, plus how many data
+    frames it held and whether it ends the stream. With `entry_id`, the
+    first event carries it as its SSE `id:` (for Last-Event-ID resumes).
+
+    The data frames of a batch become a single `data:` event (the client
+    appends chunks as they come, so that reads the same). An error frame is
+    sent as `[Error: ...]` and ends the stream like an end frame.
+    """
+    events, data_frames, ended = _entry_events(fields)
+    if entry_id is not None and events:
+        events = sse.with_event_id(entry_id, events)
+    return events, data_frames, ended
+
+
+def _entry_events(fields: Sequence) -> Tuple[bytes, int, bool]:
+    legacy = sse.field_value(fields, LEGACY_FIELD)
+    if legacy is not None:
+        if legacy == sse.END_OF_STREAM or legacy == sse.END_OF_STREAM.encode():
+            return sse.END_OF_STREAM_EVENT, 0, True
+        return (sse.encode_event(legacy), 1, False) if legacy else (b"", 0, False)
+
+    payload = sse.field_value(fields, BATCH_FIELD)
+    if payload is None:
+        return b"", 0, False
+    data, events = [], []
+    ended = False
+    for kind, body in decode_frames(payload):
+        if kind == DATA:
+            if body:
+                data.append(body)
+        elif kind == ERROR:
+            events.append(sse.encode_event(b"[Error: " + body + b"]"))
+            ended = True
+            break
+        elif kind == END:
+            ended = True
+            break
+        # Heartbeats only prove the producer is alive; nothing to send.
+    if data:
+        events.insert(0, sse.encode_event(b"".join(data)))
+    if ended:
+        events.append(sse.END_OF_STREAM_EVENT)
+    return b"".join(events), len(data), ended
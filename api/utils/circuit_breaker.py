@@ -0,0 +1,142 @@
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from utils.logger import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Error-rate / slow-call circuit breaker for one dependency (the backend).
+
+    Outcomes of the last `window` seconds are kept per call. Once at least
+    `min_calls` are in the window and either the failure rate reaches
+    `failure_rate` or the share of calls slower than `slow_call_seconds`
+    reaches `slow_call_rate`, the circuit opens: `before_call` raises
+    `CircuitOpenError` right away for `open_seconds`, instead of every request
+    waiting out the timeout. After that the circuit is half-open and lets
+    `half_open_calls` probes through; all of them succeeding closes it again,
+    any failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30.0,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 15.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0  # half-open calls let through and not yet finished
+        self._probe_successes = 0
+        # (finished at, failed, slow)
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError if the call must not go out; otherwise reserves a slot."""
+        if self.state == OPEN:
+            retry_after = self._opened_at + self.open_seconds - time.monotonic()
+            if retry_after > 0:
+                raise CircuitOpenError(self.name, retry_after)
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._probes += 1
+
+    def record(self, duration: float, failed: bool) -> None:
+        """Records the outcome of a call that `before_call` let through."""
+        now = time.monotonic()
+        slow = duration >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if failed or slow:
+                self._open(now, "probe failed" if failed else "probe slow")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+        if self.state == OPEN:
+            # A call that started before the circuit opened; it tells us nothing new.
+            return
+
+        self._calls.append((now, failed, slow))
+        self._trim(now)
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+        slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+        if failures / total >= self.failure_rate:
+            self._open(now, f"failure rate {failures}/{total}")
+        elif slow_calls / total >= self.slow_call_rate:
+            self._open(now, f"slow calls {slow_calls}/{total}")
+
+    def cancel(self) -> None:
+        """Releases the slot of a call that was abandoned without an outcome (e.g. a losing hedge)."""
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    @property
+    def retry_after(self) -> Optional[float]:
+        if self.state != OPEN:
+            return None
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        return {
+            "state": self.state,
+            "calls": len(self._calls),
+            "failures": sum(1 for _, failed, _ in self._calls if failed),
+            "slow": sum(1 for _, _, slow in self._calls if slow),
+        }
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _open(self, now: float, reason: str) -> None:
+        self._opened_at = now
+        self._transition(OPEN, reason)
+
+    def _transition(self, state: str, reason: Optional[str] = None) -> None:
+        if state == self.state:
+            return
+        logger.warning("Circuit breaker state change", extra={
+            "circuit": self.name, "from": self.state, "to": state, "reason": reason,
+        })
+        self.state = state
+        self._probes = 0
+        self._probe_successes = 0
+        if state != HALF_OPEN:
+            # A fresh window after each open/close, so old failures don't reopen it at once.
+            self._calls.clear()
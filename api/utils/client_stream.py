@@ -0,0 +1,103 @@
+import asyncio
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from utils.logger import logger
+from api.utils import metrics, sse
+
+SLOW_CLIENT_POLICIES = ("disconnect", "wait")
+
+
+class ClientStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that stops as soon as the client is gone or stuck.
+
+    Under ASGI 2.4 servers (uvicorn) Starlette no longer listens for
+    disconnects and writes to a closed connection are silently dropped, so a
+    plain StreamingResponse keeps its generator, and the Redis reads behind it,
+    alive until the stream's own idle timeout. Here one watcher per response
+    polls `request.is_disconnected()` and also checks how long the current
+    send has been blocked: the server's write buffer is bounded, so a send only
+    blocks once that buffer is full of data the client isn't reading. After
+    `stall_timeout` seconds, the "disconnect" policy gives up on the client
+    ("wait" keeps waiting). Either way the body generator is cancelled at
+    once, so its `finally` releases subscriptions and pending acks; anything
+    not yet written stays unacknowledged for /api/recover.
+    """
+
+    def __init__(
+        self,
+        content,
+        request: Request,
+        stall_timeout: float = 10.0,
+        slow_client_policy: str = "disconnect",
+        poll_interval: float = 0.5,
+        **kwargs,
+    ):
+        assert slow_client_policy in SLOW_CLIENT_POLICIES
+        super().__init__(content, **kwargs)
+        self.request = request
+        self.stall_timeout = stall_timeout
+        self.slow_client_policy = slow_client_policy
+        self.poll_interval = poll_interval
+        self._send_started: Optional[float] = None
+
+    async def stream_response(self, send: Send) -> None:
+        loop = asyncio.get_running_loop()
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for chunk in self.body_iterator:
+            if not isinstance(chunk, (bytes, memoryview)):
+                chunk = chunk.encode(self.charset)
+            self._send_started = loop.time()
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            self._send_started = None
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _watch(self) -> str:
+        """Returns why the stream should stop: "disconnect" or "slow"."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if await self.request.is_disconnected():
+                return "disconnect"
+            if (
+                self.slow_client_policy == "disconnect"
+                and self._send_started is not None
+                and loop.time() - self._send_started > self.stall_timeout
+            ):
+                return "slow"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stream = asyncio.create_task(self.stream_response(send))
+        watcher = asyncio.create_task(self._watch())
+        try:
+            await asyncio.wait((stream, watcher), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not stream.done():
+                stream.cancel()
+            watcher.cancel()
+
+        if watcher.done() and not watcher.cancelled():
+            reason = watcher.result()
+            metrics.stream_client_aborts.inc(reason)
+            logger.info("Client stream aborted", extra={"reason": reason, "path": scope.get("path")})
+        try:
+            await stream
+        except asyncio.CancelledError:
+            # Cancelled by the watcher above, not from outside: the response is just over.
+            if not watcher.done() or watcher.cancelled():
+                raise
+        except OSError:
+            # The connection went away mid-write.
+            metrics.stream_client_aborts.inc("disconnect")
+            return
+        finally:
+            # Cancelled between chunks (in `send`), the generator is still suspended at
+            # its `yield`; close it now rather than whenever it is garbage collected.
+            await sse.aclose(self.body_iterator)
+
+        if self.background is not None:
+            await self.background()
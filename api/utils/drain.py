@@ -0,0 +1,39 @@
+import time
+from typing import Optional
+
+from api.utils import sse
+
+RECOVER_HINT_PREFIX = "[Recover:"
+
+
+def recover_hint(stream_id: str) -> bytes:
+    """Tells the client to reconnect through /api/recover/{stream_id} (elsewhere)."""
+    return sse.encode_event(f"{RECOVER_HINT_PREFIX} {stream_id}]")
+
+
+class DrainState:
+    """
+    Per-process shutdown state for long-lived SSE streams.
+
+    `start` is called when the server gets SIGTERM (see server.py). Streams
+    keep going for `grace` seconds so short answers simply finish; whatever is
+    still streaming after that ends with a recover hint instead of being cut
+    off when the worker exits.
+    """
+
+    def __init__(self):
+        self.deadline: Optional[float] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.deadline is not None
+
+    def start(self, grace: float) -> None:
+        if self.deadline is None:
+            self.deadline = time.monotonic() + max(0.0, grace)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+drain = DrainState()
@@ -0,0 +1,389 @@
+import asyncio
+import fnmatch
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeRedisError(Exception):
+    """Raised for command errors, with Redis-style messages (e.g. BUSYGROUP)."""
+
+
+def _parse_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class _Group:
+    def __init__(self, last_delivered_id: Tuple[int, int]):
+        self.last_delivered_id = last_delivered_id
+        # entry id -> consumer name
+        self.pending: Dict[Tuple[int, int], str] = {}
+
+
+class _Stream:
+    def __init__(self):
+        self.entries: List[Tuple[Tuple[int, int], List[str]]] = []
+        self.groups: Dict[str, _Group] = {}
+
+    @property
+    def last_id(self) -> Tuple[int, int]:
+        return self.entries[-1][0] if self.entries else (0, 0)
+
+
+class FakeRedis:
+    """
+    In-memory, single-process stand-in for the subset of Redis used by the proxy.
+
+    Speaks the same `execute([...])` interface and returns the same response
+    shapes as the Upstash REST client, and honours `BLOCK` on XREAD/XREADGROUP,
+    so the streaming path can run offline in local dev and benchmarks.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._changed = asyncio.Condition()
+        self.command_count = 0
+
+    # -- helpers ---------------------------------------------------------
+
+    def _expire_if_needed(self, key: str) -> None:
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def _get(self, key: str) -> Any:
+        self._expire_if_needed(key)
+        return self._data.get(key)
+
+    def _stream(self, key: str, create: bool = False) -> Optional[_Stream]:
+        value = self._get(key)
+        if value is None and create:
+            value = self._data[key] = _Stream()
+        if value is not None and not isinstance(value, _Stream):
+            raise FakeRedisError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    @staticmethod
+    def _format(entries) -> List[list]:
+        return [[f"{ms}-{seq}", list(fields)] for (ms, seq), fields in entries]
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _wait(self, block_ms: int, ready) -> Any:
+        """Waits up to `block_ms` (0 = forever) for `ready()` to return data."""
+        timeout = None if block_ms == 0 else block_ms / 1000
+        try:
+            async with self._changed:
+                return await asyncio.wait_for(self._changed.wait_for(ready), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    # -- public interface ------------------------------------------------
+
+    async def execute(self, command: List) -> Any:
+        self.command_count += 1
+        name = str(command[0]).upper()
+        args = [str(a) if not isinstance(a, (bytes, str)) else a for a in command[1:]]
+        if name == "XGROUP" or name == "XINFO" or name == "MEMORY":
+            name = f"{name}_{str(args.pop(0)).upper()}"
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            raise FakeRedisError(f"ERR unknown command '{command[0]}'")
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def pipeline(self, commands: List[List]) -> List[Any]:
+        return [await self.execute(command) for command in commands]
+
+    # -- keys ------------------------------------------------------------
+
+    def _cmd_ping(self, *args):
+        return "PONG"
+
+    def _cmd_set(self, key, value, *options):
+        self._data[key] = value
+        self._expires.pop(key, None)
+        options = [o.upper() for o in options]
+        if "EX" in options:
+            self._expires[key] = time.monotonic() + int(options[options.index("EX") + 1])
+        return "OK"
+
+    def _cmd_get(self, key):
+        value = self._get(key)
+        return value if not isinstance(value, _Stream) else None
+
+    def _cmd_incrby(self, key, amount):
+        value = int(self._get(key) or 0) + int(amount)
+        self._data[key] = str(value)
+        return value
+
+    def _cmd_pexpire(self, key, milliseconds, *options):
+        if self._get(key) is None:
+            return 0
+        self._expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def _cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get(key) is not None:
+                removed += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return removed
+
+    def _cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._get(key) is not None)
+
+    def _cmd_expire(self, key, seconds, *options):
+        if self._get(key) is None:
+            return 0
+        self._expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def _cmd_ttl(self, key):
+        if self._get(key) is None:
+            return -2
+        deadline = self._expires.get(key)
+        return -1 if deadline is None else max(0, int(deadline - time.monotonic()))
+
+    def _cmd_type(self, key):
+        value = self._get(key)
+        if value is None:
+            return "none"
+        return "stream" if isinstance(value, _Stream) else "string"
+
+    def _cmd_scan(self, cursor, *options):
+        options = list(options)
+        upper = [str(o).upper() for o in options]
+        pattern = options[upper.index("MATCH") + 1] if "MATCH" in upper else "*"
+        count = int(options[upper.index("COUNT") + 1]) if "COUNT" in upper else 10
+        key_type = options[upper.index("TYPE") + 1].lower() if "TYPE" in upper else None
+        keys = sorted(self._data)
+        start = int(cursor)
+        batch = keys[start:start + count]
+        next_cursor = start + count if start + count < len(keys) else 0
+        matched = [
+            key for key in batch
+            if self._get(key) is not None
+            and fnmatch.fnmatchcase(key, pattern)
+            and (key_type is None or self._cmd_type(key) == key_type)
+        ]
+        return [str(next_cursor), matched]
+
+    def _cmd_memory_usage(self, key, *options):
+        value = self._get(key)
+        if value is None:
+            return None
+        if isinstance(value, _Stream):
+            return 64 + sum(24 + sum(len(f) for f in fields) for _, fields in value.entries)
+        return 16 + len(str(value))
+
+    # -- streams ---------------------------------------------------------
+
+    async def _cmd_xadd(self, key, *args):
+        args = list(args)
+        if args and args[0].upper() == "NOMKSTREAM":
+            args.pop(0)
+            if self._stream(key) is None:
+                return None
+        maxlen = None
+        if args and args[0].upper() == "MAXLEN":
+            args.pop(0)
+            if args[0] in ("~", "="):
+                args.pop(0)
+            maxlen = int(args.pop(0))
+        entry_id, fields = args[0], args[1:]
+        stream = self._stream(key, create=True)
+        if entry_id == "*":
+            ms = int(time.time() * 1000)
+            last_ms, last_seq = stream.last_id
+            new_id = (last_ms, last_seq + 1) if ms <= last_ms else (ms, 0)
+        else:
+            new_id = _parse_id(entry_id)
+            if new_id <= stream.last_id:
+                raise FakeRedisError(
+                    "ERR The ID specified in XADD is equal or smaller than the target stream top item"
+                )
+        stream.entries.append((new_id, list(fields)))
+        if maxlen is not None and len(stream.entries) > maxlen:
+            del stream.entries[: len(stream.entries) - maxlen]
+        await self._notify()
+        return f"{new_id[0]}-{new_id[1]}"
+
+    def _cmd_xlen(self, key):
+        stream = self._stream(key)
+        return len(stream.entries) if stream else 0
+
+    def _cmd_xrange(self, key, start, end, *options):
+        stream = self._stream(key)
+        if stream is None:
+            return []
+        exclusive_start = start.startswith("(")
+        low = (0, 0) if start == "-" else _parse_id(start.lstrip("("))
+        high = (float("inf"), 0) if end == "+" else _parse_id(end)
+        entries = [
+            (entry_id, fields) for entry_id, fields in stream.entries
+            if (entry_id > low if exclusive_start else entry_id >= low) and entry_id <= high
+        ]
+        if options and options[0].upper() == "COUNT":
+            entries = entries[: int(options[1])]
+        return self._format(entries)
+
+    def _cmd_xrevrange(self, key, end, start, *options):
+        entries = self._cmd_xrange(key, start, end)[::-1]
+        if options and options[0].upper() == "COUNT":
+            entries = entries[: int(options[1])]
+        return entries
+
+    def _cmd_xgroup_create(self, key, group, start_id, *options):
+        stream = self._stream(key, create="MKSTREAM" in [o.upper() for o in options])
+        if stream is None:
+            raise FakeRedisError("ERR The XGROUP subcommand requires the key to exist")
+        if group in stream.groups:
+            raise FakeRedisError("BUSYGROUP Consumer Group name already exists")
+        last = stream.last_id if start_id == "$" else _parse_id(start_id)
+        stream.groups[group] = _Group(last)
+        return "OK"
+
+    def _cmd_xgroup_setid(self, key, group, entry_id):
+        stream = self._stream(key)
+        if stream is None or group not in stream.groups:
+            raise FakeRedisError(f"NOGROUP No such key '{key}' or consumer group '{group}'")
+        stream.groups[group].last_delivered_id = (
+            stream.last_id if entry_id == "$" else _parse_id(entry_id)
+        )
+        return "OK"
+
+    def _cmd_xgroup_destroy(self, key, group):
+        stream = self._stream(key)
+        if stream is None:
+            return 0
+        return 1 if stream.groups.pop(group, None) is not None else 0
+
+    def _cmd_xinfo_groups(self, key):
+        stream = self._stream(key)
+        if stream is None:
+            raise FakeRedisError("ERR no such key")
+        return [
+            [
+                "name", name,
+                "consumers", len(set(group.pending.values())),
+                "pending", len(group.pending),
+                "last-delivered-id", "%d-%d" % group.last_delivered_id,
+            ]
+            for name, group in stream.groups.items()
+        ]
+
+    def _cmd_xack(self, key, group, *entry_ids):
+        stream = self._stream(key)
+        if stream is None or group not in stream.groups:
+            return 0
+        pending = stream.groups[group].pending
+        return sum(1 for entry_id in entry_ids if pending.pop(_parse_id(entry_id), None) is not None)
+
+    def _cmd_xpending(self, key, group, *args):
+        stream = self._stream(key)
+        if stream is None or group not in stream.groups:
+            raise FakeRedisError(f"NOGROUP No such key '{key}' or consumer group '{group}'")
+        pending = stream.groups[group].pending
+        if args:
+            raise FakeRedisError("ERR only the XPENDING summary form is supported")
+        if not pending:
+            return [0, None, None, None]
+        ids = sorted(pending)
+        per_consumer: Dict[str, int] = {}
+        for consumer in pending.values():
+            per_consumer[consumer] = per_consumer.get(consumer, 0) + 1
+        return [
+            len(ids), "%d-%d" % ids[0], "%d-%d" % ids[-1],
+            [[consumer, str(count)] for consumer, count in per_consumer.items()],
+        ]
+
+    @staticmethod
+    def _parse_read_args(args):
+        args = list(args)
+        count, block_ms = None, None
+        while args and args[0].upper() != "STREAMS":
+            option = args.pop(0).upper()
+            if option == "COUNT":
+                count = int(args.pop(0))
+            elif option == "BLOCK":
+                block_ms = int(args.pop(0))
+            elif option == "NOACK":
+                continue
+        args.pop(0)  # STREAMS
+        half = len(args) // 2
+        return count, block_ms, list(zip(args[:half], args[half:]))
+
+    async def _cmd_xread(self, *args):
+        count, block_ms, streams = self._parse_read_args(args)
+        # `$` is resolved once, at call time, like real Redis
+        cursors = []
+        for key, entry_id in streams:
+            stream = self._stream(key)
+            if entry_id == "$":
+                cursors.append((key, stream.last_id if stream else (0, 0)))
+            else:
+                cursors.append((key, _parse_id(entry_id)))
+
+        def collect():
+            result = []
+            for key, cursor in cursors:
+                stream = self._stream(key)
+                if stream is None:
+                    continue
+                entries = [e for e in stream.entries if e[0] > cursor][:count]
+                if entries:
+                    result.append([key, self._format(entries)])
+            return result or None
+
+        result = collect()
+        if result is None and block_ms is not None:
+            result = await self._wait(block_ms, collect)
+        return result
+
+    async def _cmd_xreadgroup(self, *args):
+        args = list(args)
+        if args[0].upper() != "GROUP":
+            raise FakeRedisError("ERR syntax error")
+        group_name, consumer = args[1], args[2]
+        count, block_ms, streams = self._parse_read_args(args[3:])
+
+        def collect():
+            result = []
+            for key, entry_id in streams:
+                stream = self._stream(key)
+                if stream is None or group_name not in stream.groups:
+                    raise FakeRedisError(
+                        f"NOGROUP No such key '{key}' or consumer group '{group_name}' in XREADGROUP"
+                    )
+                group = stream.groups[group_name]
+                if entry_id == ">":
+                    entries = [e for e in stream.entries if e[0] > group.last_delivered_id][:count]
+                    if entries:
+                        group.last_delivered_id = entries[-1][0]
+                        for new_id, _ in entries:
+                            group.pending[new_id] = consumer
+                        result.append([key, self._format(entries)])
+                else:
+                    # History of this consumer's pending entries; never blocks.
+                    cursor = _parse_id(entry_id)
+                    entries = [
+                        e for e in stream.entries
+                        if e[0] > cursor and group.pending.get(e[0]) == consumer
+                    ][:count]
+                    result.append([key, self._format(entries)])
+            return result or None
+
+        result = collect()
+        blocking_ids = all(entry_id == ">" for _, entry_id in streams)
+        if result is None and block_ms is not None and blocking_ids:
+            result = await self._wait(block_ms, collect)
+        return result
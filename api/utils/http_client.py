@@ -0,0 +1,87 @@
+import importlib.util
+import os
+from typing import Dict
+
+import httpx
+
+from utils.logger import logger
+
+
+def _http2_available() -> bool:
+    # Checked without importing it, so h2 costs nothing at startup until a client uses it.
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClientPool:
+    """
+    Long-lived, keep-alive `httpx.AsyncClient`s shared across requests.
+
+    Clients are created on first use and closed from the app lifespan, so
+    triggering the backend reuses warm TCP/TLS connections instead of paying
+    a handshake per chat message. Limits and per-phase timeouts come from
+    the environment; HTTP/2 is negotiated via ALPN when `h2` is installed.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        )
+        self.timeout = httpx.Timeout(
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            read=float(os.getenv("HTTP_READ_TIMEOUT", "10")),
+            write=float(os.getenv("HTTP_WRITE_TIMEOUT", "10")),
+            pool=float(os.getenv("HTTP_POOL_TIMEOUT", "5")),
+        )
+        self.http2 = os.getenv("HTTP2", "1").lower() not in ("0", "false", "no") and _http2_available()
+
+    def client(self, name: str = "default", **overrides) -> httpx.AsyncClient:
+        """Returns the shared client for `name`, creating it on first use."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            counters = self._counters.setdefault(name, {"requests": 0, "responses": 0, "errors": 0})
+
+            async def on_request(request: httpx.Request) -> None:
+                counters["requests"] += 1
+
+            async def on_response(response: httpx.Response) -> None:
+                counters["responses"] += 1
+                if response.is_error:
+                    counters["errors"] += 1
+
+            options = {
+                "limits": self.limits,
+                "timeout": self.timeout,
+                "http2": self.http2,
+                "event_hooks": {"request": [on_request], "response": [on_response]},
+                **overrides,
+            }
+            client = self._clients[name] = httpx.AsyncClient(**options)
+            logger.info("HTTP client created", extra={"client": name, "http2": options["http2"]})
+        return client
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        for name, client in self._clients.items():
+            entry = {"closed": client.is_closed, **self._counters.get(name, {})}
+            # httpcore doesn't expose pool stats publicly; best effort.
+            connections = getattr(getattr(client._transport, "_pool", None), "connections", None)
+            if connections is not None:
+                entry["connections"] = len(connections)
+                entry["idle_connections"] = sum(1 for c in connections if c.is_idle())
+                entry["http2_connections"] = sum(
+                    1 for c in connections if "HTTP/2" in repr(c)
+                )
+            stats[name] = entry
+        return stats
+
+    async def aclose(self) -> None:
+        for name, client in list(self._clients.items()):
+            await client.aclose()
+        self._clients.clear()
+
+
+http_clients = HttpClientPool()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+
+class PollBudget:
+    """
+    Process-wide token bucket for Redis polls, shared by every stream.
+
+    `rate` is polls per second (0 = unlimited). When the bucket is empty,
+    pollers wait their turn instead of hammering Redis; with many streams this
+    stretches everyone's interval a little rather than letting the request
+    rate grow with the number of open chats.
+    """
+
+    def __init__(self, rate: float = 0, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class StreamPollSchedule:
+    """
+    Poll timing for one stream.
+
+    Until the first chunk it polls steadily every `first_token_interval`.
+    Once chunks flow it tracks their cadence (EWMA of the per-entry gap between
+    stream IDs) and polls at `cadence_factor` times that, so a fast producer
+    is read fast and a slow one isn't over-polled. Empty reads after that back
+    off by `backoff` up to `max_interval`. Every delay gets +/- `jitter` so
+    streams opened together don't poll in lockstep.
+    """
+
+    def __init__(self, scheduler: "PollScheduler"):
+        self.scheduler = scheduler
+        self.interval = scheduler.first_token_interval
+        self.cadence: Optional[float] = None
+        self._last_entry_ms: Optional[int] = None
+        self._polled = False
+
+    def on_data(self, last_entry_ms: int, count: int = 1) -> None:
+        """A read returned `count` entries, the newest written at `last_entry_ms` (its stream ID)."""
+        scheduler = self.scheduler
+        if self._last_entry_ms is not None and count > 0:
+            # Entry IDs carry the time Redis stored them, so the cadence doesn't
+            # depend on how often we happened to poll.
+            gap = max(0.0, (last_entry_ms - self._last_entry_ms) / 1000 / count)
+            self.cadence = gap if self.cadence is None else self.cadence + scheduler.smoothing * (gap - self.cadence)
+        self._last_entry_ms = last_entry_ms
+        if self.cadence is not None:
+            self.interval = self.cadence * scheduler.cadence_factor
+        else:
+            self.interval = scheduler.min_interval
+        self.interval = min(max(self.interval, scheduler.min_interval), scheduler.max_interval)
+
+    def on_empty(self) -> None:
+        scheduler = self.scheduler
+        if self._last_entry_ms is None:
+            return
+        self.interval = min(max(self.interval * scheduler.backoff, scheduler.min_interval), scheduler.max_interval)
+
+    def next_delay(self) -> float:
+        jitter = self.scheduler.jitter
+        return self.interval * random.uniform(1 - jitter, 1 + jitter)
+
+    async def wait(self) -> None:
+        """Sleeps until this stream's next poll (not before the first) and takes a budget token."""
+        if self._polled:
+            await asyncio.sleep(self.next_delay())
+        self._polled = True
+        await self.scheduler.budget.acquire()
+
+
+class PollScheduler:
+    """Shared settings and budget for per-stream poll schedules."""
+
+    def __init__(
+        self,
+        min_interval: float = 0.05,
+        max_interval: float = 2.0,
+        first_token_interval: float = 0.15,
+        cadence_factor: float = 1.0,
+        backoff: float = 1.5,
+        jitter: float = 0.2,
+        smoothing: float = 0.3,
+        budget: Optional[PollBudget] = None,
+    ):
+        assert 0 < min_interval <= max_interval and 0 <= jitter < 1
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.first_token_interval = first_token_interval
+        self.cadence_factor = cadence_factor
+        self.backoff = backoff
+        self.jitter = jitter
+        self.smoothing = smoothing
+        self.budget = budget or PollBudget()
+
+    def stream(self) -> StreamPollSchedule:
+        return StreamPollSchedule(self)
+
+
+def create_poll_scheduler() -> PollScheduler:
+    """Builds the process-wide scheduler from POLL_* / REDIS_POLL_RPS env vars."""
+    return PollScheduler(
+        min_interval=float(os.getenv("POLL_MIN_MS", "50")) / 1000,
+        max_interval=float(os.getenv("POLL_MAX_MS", "2000")) / 1000,
+        first_token_interval=float(os.getenv("POLL_FIRST_TOKEN_MS", "150")) / 1000,
+        cadence_factor=float(os.getenv("POLL_CADENCE_FACTOR", "1.0")),
+        backoff=float(os.getenv("POLL_BACKOFF", "1.5")),
+        jitter=float(os.getenv("POLL_JITTER", "0.2")),
+        budget=PollBudget(float(os.getenv("REDIS_POLL_RPS", "0"))),
+    )
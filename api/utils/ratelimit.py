@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Set
+
+from utils.logger import logger
+from api.utils.stream_transport import StreamTransport
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float  # unix seconds when the current window ends
+    local: bool = False  # answered from the in-process cache, no Redis call
+
+
+class _LocalState:
+    __slots__ = ("window", "remaining", "blocked_until")
+
+    def __init__(self, window: int, remaining: int, blocked_until: float):
+        self.window = window
+        self.remaining = remaining
+        self.blocked_until = blocked_until
+
+
+class SlidingWindowRateLimiter:
+    """
+    asyncio-native sliding-window limiter on the shared stream transport.
+
+    Same algorithm, key layout and prefix as `upstash_ratelimit.SlidingWindow`
+    (weighted current + previous fixed window), so limits carry over. An
+    in-process cache of the last Redis answer per identifier sits in front:
+    identifiers known to be blocked are rejected until the window would
+    actually let them through. Everything else waits on one Redis round-trip.
+
+    With `local_admit`, identifiers with plenty of headroom left in this
+    window are also admitted immediately while the hit is recorded in Redis
+    in the background. That headroom is only what this process last saw, so
+    across several processes the limit becomes roughly per process: it
+    loosens the limit and is off by default.
+    """
+
+    # Like upstash_ratelimit's SlidingWindow script, but also returns the raw
+    # window counts so the local cache can work out when a block expires.
+    SCRIPT = """
+    local current_key  = KEYS[1]
+    local previous_key = KEYS[2]
+    local tokens       = tonumber(ARGV[1])
+    local now          = ARGV[2]
+    local window       = ARGV[3]
+    local increment_by = ARGV[4]
+
+    local current = tonumber(redis.call("GET", current_key) or 0)
+    local previous = tonumber(redis.call("GET", previous_key) or 0)
+    local percentage_in_current = ( now % window ) / window
+    local weighted_previous = math.floor(( 1 - percentage_in_current ) * previous)
+    if weighted_previous + current >= tokens then
+        return {-1, current, previous}
+    end
+
+    local new_value = redis.call("INCRBY", current_key, increment_by)
+    if new_value == tonumber(increment_by) then
+        redis.call("PEXPIRE", current_key, window * 2 + 1000)
+    end
+    return {tokens - ( new_value + weighted_previous ), new_value, previous}
+    """
+    SCRIPT_SHA = hashlib.sha1(SCRIPT.encode()).hexdigest()
+
+    def __init__(
+        self,
+        transport: StreamTransport,
+        max_requests: int = 3,
+        window: int = 10,
+        prefix: str = "@upstash/ratelimit",
+        local_admit: bool = False,
+        local_headroom: int = 2,
+        max_local_entries: int = 10_000,
+    ):
+        assert max_requests > 0 and window > 0
+        self.transport = transport
+        self.max_requests = max_requests
+        self.window_ms = window * 1000
+        self.prefix = prefix
+        # Admit locally (local_admit) only while at least this many requests are known to remain.
+        self.local_admit = local_admit
+        self.local_headroom = local_headroom
+        self.max_local_entries = max_local_entries
+        self._local: "OrderedDict[str, _LocalState]" = OrderedDict()
+        self._background: Set[asyncio.Task] = set()
+
+    async def limit(self, identifier: str) -> RateLimitResult:
+        now_ms = int(time.time() * 1000)
+        current_window = now_ms // self.window_ms
+        reset = (current_window + 1) * self.window_ms / 1000
+        key = f"{self.prefix}:{identifier}"
+
+        state = self._local.get(key)
+        if state is not None:
+            self._local.move_to_end(key)
+            if state.blocked_until > now_ms:
+                return RateLimitResult(False, self.max_requests, 0, state.blocked_until / 1000, local=True)
+            if self.local_admit and state.window == current_window and state.remaining >= self.local_headroom:
+                state.remaining -= 1
+                task = asyncio.create_task(self._record_in_background(key, now_ms))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+                return RateLimitResult(True, self.max_requests, state.remaining, reset, local=True)
+
+        remaining, current, previous = await self._record(key, now_ms)
+        self._remember(key, now_ms, remaining, current, previous)
+        return RateLimitResult(remaining >= 0, self.max_requests, max(0, remaining), reset)
+
+    async def _record(self, key: str, now_ms: int):
+        current_window = now_ms // self.window_ms
+        keys = [f"{key}:{current_window}", f"{key}:{current_window - 1}"]
+        args = [str(self.max_requests), str(now_ms), str(self.window_ms), "1"]
+
+        if not self.transport.supports_scripts:
+            return await self._record_without_script(keys, now_ms)
+        try:
+            result = await self.transport.execute(["EVALSHA", self.SCRIPT_SHA, "2", *keys, *args])
+        except Exception as e:
+            if "NOSCRIPT" not in str(e):
+                raise
+            result = await self.transport.execute(["EVAL", self.SCRIPT, "2", *keys, *args])
+        return tuple(int(value) for value in result)
+
+    async def _record_without_script(self, keys, now_ms: int):
+        """Same logic as SCRIPT for transports without Lua (the in-memory fake)."""
+        current, previous = (int(v or 0) for v in await self.transport.pipeline([["GET", keys[0]], ["GET", keys[1]]]))
+        weighted_previous = int((1 - (now_ms % self.window_ms) / self.window_ms) * previous)
+        if weighted_previous + current >= self.max_requests:
+            return -1, current, previous
+        new_value = int(await self.transport.execute(["INCRBY", keys[0], "1"]))
+        if new_value == 1:
+            await self.transport.execute(["PEXPIRE", keys[0], str(self.window_ms * 2 + 1000)])
+        return self.max_requests - (new_value + weighted_previous), new_value, previous
+
+    async def _record_in_background(self, key: str, now_ms: int) -> None:
+        try:
+            remaining, current, previous = await self._record(key, now_ms)
+            self._remember(key, now_ms, remaining, current, previous)
+        except Exception as e:
+            logger.warning("Background ratelimit update failed", extra={"error": str(e)})
+
+    def _remember(self, key: str, now_ms: int, remaining: int, current: int, previous: int) -> None:
+        current_window = now_ms // self.window_ms
+        window_start = current_window * self.window_ms
+        window_end = window_start + self.window_ms
+        blocked_until = 0
+        if remaining < 0:
+            if current >= self.max_requests or previous == 0:
+                blocked_until = window_end
+            else:
+                # floor((1 - p) * previous) + current < tokens once p passes this point
+                fraction = 1 - (self.max_requests - current) / previous
+                blocked_until = min(window_end, window_start + int(fraction * self.window_ms) + 1)
+
+        self._local[key] = _LocalState(current_window, max(0, remaining), blocked_until)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    async def close(self) -> None:
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
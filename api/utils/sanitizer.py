@@ -0,0 +1,141 @@
+import re
+from typing import Optional
+
+MAX_CONTENT_LENGTH = 10000  # 10KB limit
+
+# (pattern reported in the error, tag, needs closing tag) in the order the
+# original per-pattern checks ran, so the same rule is reported for the same input.
+TAG_RULES = [
+    (r'<script[^>]*>.*?</script>', "script", True),      # Script tags
+    (r'<iframe[^>]*>.*?</iframe>', "iframe", True),      # Iframe tags
+    (r'<object[^>]*>.*?</object>', "object", True),      # Object tags
+    (r'<embed[^>]*>', "embed", False),                   # Embed tags
+    (r'<form[^>]*>.*?</form>', "form", True),            # Form tags
+    (r'<input[^>]*>', "input", False),                   # Input tags
+    (r'<textarea[^>]*>.*?</textarea>', "textarea", True),  # Textarea tags
+    (r'<select[^>]*>.*?</select>', "select", True),      # Select tags
+    (r'<button[^>]*>.*?</button>', "button", True),      # Button tags
+]
+LITERAL_RULES = {
+    "javascript:": r'javascript:',         # JavaScript protocol
+    "data:text/html": r'data:text/html',   # Data URLs with HTML
+    "vbscript:": r'vbscript:',             # VBScript protocol
+}
+EVENT_HANDLER_RULE = r'on\w+\s*='  # Event handlers (onclick, onload, etc.)
+
+# Original check order, used to pick which rule to report when several match.
+RULE_ORDER = [
+    TAG_RULES[0][0], TAG_RULES[1][0],
+    LITERAL_RULES["javascript:"], LITERAL_RULES["data:text/html"], LITERAL_RULES["vbscript:"],
+    EVENT_HANDLER_RULE,
+    *(rule[0] for rule in TAG_RULES[2:]),
+]
+_RANK = {pattern: rank for rank, pattern in enumerate(RULE_ORDER)}
+
+# One pass over the input finds every place a rule could start. It scans the
+# original string, case-insensitively like the rules: lowercasing it first isn't
+# length-preserving ("İ" becomes two characters), so `\w` would see different
+# text. Only what follows a literal first character is `(?i:...)` (one branch
+# per case of it), which keeps the regex engine's fast first-character search.
+# Hits are identified by their tag's named group or by a literal's first
+# character, never by lowercasing the text ("ı" matches "i" here, but doesn't
+# lowercase to it).
+# Each tag hit is then confirmed with one forward search.
+#
+# Event handlers get a scan of their own, so tags and literals keep a regex
+# that starts with a literal character. `on\w+\s*=` can't gain from
+# backtracking (`\w` never matches `\s` or `=`), so each word is tried once
+# from its first "on" followed by a word character: `\w++` takes the rest of
+# the word, and the optional group says whether `\s*=` follows. The next
+# search starts after the word instead of at its next "on", so the scan stays
+# linear.
+
+# group name -> (pattern, closing tag matcher or None)
+_TAGS = {
+    f"tag_{tag}": (pattern, re.compile(f"</{tag}>", re.IGNORECASE) if closing else None)
+    for pattern, tag, closing in TAG_RULES
+}
+# The literals start with different ASCII letters, which IGNORECASE matches in exactly two cases.
+_LITERALS = {literal[0]: pattern for literal, pattern in LITERAL_RULES.items()}
+assert len(_LITERALS) == len(LITERAL_RULES)
+
+_TAG_TRIGGER = "<(?=(?i:" + "|".join(
+    f"(?P<tag_{tag}>{tag})" for _, tag, _ in sorted(TAG_RULES, key=lambda rule: len(rule[1]), reverse=True)
+) + "))"
+_LITERAL_TRIGGER = "|".join(
+    f"{first}(?i:{re.escape(literal[1:])})"
+    for literal in LITERAL_RULES
+    for first in (literal[0], literal[0].upper())
+)
+_TRIGGERS = re.compile(f"{_TAG_TRIGGER}|{_LITERAL_TRIGGER}")
+_EVENT_WORDS = re.compile(r"(?i:on)(?=\w)\w++(\s*+=)?")
+
+
+def find_malicious_pattern(content: str) -> Optional[str]:
+    """
+    Returns the first rule (in the original check order) that `content`
+    matches, or None. Linear in the input: a single regex scan, plus one
+    forward search per tag type.
+    """
+    best = None
+    checked_tags = set()
+    for match in _TRIGGERS.finditer(content):
+        group = match.lastgroup
+        if group is None:
+            pattern = _LITERALS[match.group(0)[0].lower()]
+        else:
+            if group in checked_tags:
+                continue
+            checked_tags.add(group)
+            pattern, closing = _TAGS[group]
+            # Earliest `<tag` is the only one that matters: `[^>]*>` ends at
+            # the next `>`, and `.*?</tag>` just needs a close after it.
+            tag_end = content.find(">", match.end(group))
+            if tag_end == -1 or (closing is not None and closing.search(content, tag_end + 1) is None):
+                continue
+
+        if best is None or _RANK[pattern] < _RANK[best]:
+            best = pattern
+            if _RANK[best] == 0:
+                break
+
+    if best is None or _RANK[best] > _RANK[EVENT_HANDLER_RULE]:
+        if any(word.group(1) is not None for word in _EVENT_WORDS.finditer(content)):
+            best = EVENT_HANDLER_RULE
+    return best
+
+
+def sanitize_content(content: str) -> str:
+    """
+    Sanitize user input to prevent injection attacks.
+    Returns the cleaned content or raises ValueError if malicious.
+    """
+    if not content:
+        return content
+
+    # Basic length check, first, so oversized input never reaches the scanner
+    if len(content) > MAX_CONTENT_LENGTH:
+        raise ValueError("Content too long")
+
+    pattern = find_malicious_pattern(content)
+    if pattern is not None:
+        raise ValueError(f"Potentially malicious content detected: {pattern}")
+
+    # # Check for suspicious URLs
+    # url_patterns = [
+    #     r'https?://[^\s<>"]*',  # HTTP/HTTPS URLs
+    # ]
+
+    # for pattern in url_patterns:
+    #     matches = re.findall(pattern, content, re.IGNORECASE)
+    #     for url in matches:
+    #         # Allow common safe domains (customize as needed)
+    #         safe_domains = [
+    #             'github.com', 'stackoverflow.com', 'wikipedia.org',
+    #             'docs.python.org', 'python.org', 'pypi.org'
+    #         ]
+    #         is_safe = any(domain in url.lower() for domain in safe_domains)
+    #         if not is_safe:
+    #             raise ValueError(f"Potentially unsafe URL detected: {url}")
+
+    return content
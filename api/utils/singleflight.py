@@ -0,0 +1,117 @@
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Follower IDs look like "<source stream_id>~<suffix>": they read the source
+# stream through their own consumer group, so acks and recovery stay per client.
+FOLLOWER_SEPARATOR = "~"
+
+
+def source_stream_id(stream_id: str) -> str:
+    """The stream a (possibly follower) stream_id reads from."""
+    return stream_id.split(FOLLOWER_SEPARATOR, 1)[0]
+
+
+def follower_stream_id(source_id: str) -> str:
+    return f"{source_id}{FOLLOWER_SEPARATOR}{uuid.uuid4().hex[:12]}"
+
+
+def normalize_prompt(content: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt."""
+    return " ".join(content.casefold().split())
+
+
+class _Flight:
+    __slots__ = ("stream_id", "key", "completed", "expires_at")
+
+    def __init__(self, stream_id: str, key: str, expires_at: float):
+        self.stream_id = stream_id
+        self.key = key
+        self.completed = False
+        self.expires_at = expires_at
+
+
+class PromptSingleflight:
+    """
+    Maps identical prompts to one backend generation.
+
+    The first request for a prompt (the leader) triggers the backend as usual
+    and registers its stream_id here. Identical requests that arrive while it
+    is generating, or within `ttl` seconds after it finished, attach to that
+    stream instead of starting another generation. `scope` decides what
+    "identical" means:
+
+    - "content": same normalized content, whatever the thread. Only right for
+      stateless questions, since the backend answers with thread history.
+    - "thread": same thread and same content, i.e. duplicate submits.
+    - "off": disabled.
+
+    A prompt counts as in flight from the moment its backend call goes out,
+    so duplicates that arrive during the trigger attach too. If the trigger
+    fails, the flight is dropped and the error is written to the leader's
+    stream, so the prompts that attached to it end with the same error.
+    """
+
+    def __init__(self, scope: str = "off", ttl: float = 300, max_entries: int = 1000):
+        assert scope in ("off", "content", "thread")
+        self.scope = scope
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._flights: "OrderedDict[str, _Flight]" = OrderedDict()
+        self._by_stream = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.scope != "off"
+
+    def key(self, content: str, thread_id: Optional[str]) -> Optional[str]:
+        if not self.enabled or not content:
+            return None
+        if self.scope == "thread" and not thread_id:
+            # Requests without a thread would all share one scope and coalesce across users.
+            return None
+        scope = thread_id if self.scope == "thread" else ""
+        digest = hashlib.blake2b(normalize_prompt(content).encode("utf-8"), digest_size=16).hexdigest()
+        return f"{scope}:{digest}"
+
+    def lookup(self, key: Optional[str]) -> Optional[Tuple[str, bool]]:
+        """(stream_id, completed) of a live flight for `key`, or None."""
+        if key is None:
+            return None
+        flight = self._flights.get(key)
+        if flight is None:
+            return None
+        if flight.expires_at <= time.monotonic():
+            self._drop(flight)
+            return None
+        return flight.stream_id, flight.completed
+
+    def start(self, key: Optional[str], stream_id: str) -> None:
+        if key is None:
+            return
+        existing = self._flights.get(key)
+        if existing is not None:
+            self._drop(existing)
+        flight = _Flight(stream_id, key, time.monotonic() + self.ttl)
+        self._flights[key] = flight
+        self._by_stream[stream_id] = flight
+        while len(self._flights) > self.max_entries:
+            self._drop(next(iter(self._flights.values())))
+
+    def finish(self, stream_id: str, completed: bool) -> None:
+        """Marks a generation done; failed or timed-out ones stop taking followers."""
+        flight = self._by_stream.get(source_stream_id(stream_id))
+        if flight is None:
+            return
+        if completed:
+            flight.completed = True
+            flight.expires_at = time.monotonic() + self.ttl
+        else:
+            self._drop(flight)
+
+    def _drop(self, flight: _Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        self._by_stream.pop(flight.stream_id, None)
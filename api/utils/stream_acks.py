@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import List, Optional, Set
+
+from utils.logger import logger
+from api.utils.stream_transport import StreamTransport
+
+
+class AckBatcher:
+    """
+    Collects XACKs for one consumer and sends them as a single multi-ID XACK.
+
+    Pending acks ride along with the consumer's next read in the same
+    pipeline (see `take_command`), and are flushed on their own once
+    `max_batch` IDs or `max_delay` seconds have piled up. Unacked IDs stay in
+    the group's pending list, so anything not yet flushed is simply replayed
+    by `/api/recover` - batching never loses a chunk.
+    """
+
+    # Fire-and-forget flushes scheduled from disconnect paths
+    _background: Set[asyncio.Task] = set()
+
+    def __init__(
+        self,
+        transport: StreamTransport,
+        stream_key: str,
+        group_name: str,
+        max_batch: int = 20,
+        max_delay: float = 0.25,
+    ):
+        self.transport = transport
+        self.stream_key = stream_key
+        self.group_name = group_name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._ids: List[str] = []
+        self._oldest: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, message_id: str) -> None:
+        if not self._ids:
+            self._oldest = time.monotonic()
+        self._ids.append(message_id)
+
+    @property
+    def due(self) -> bool:
+        return bool(self._ids) and (
+            len(self._ids) >= self.max_batch
+            or time.monotonic() - self._oldest >= self.max_delay
+        )
+
+    def take_command(self) -> Optional[List[str]]:
+        """Returns the XACK for everything pending and clears the batch (None if empty)."""
+        if not self._ids:
+            return None
+        command = ["XACK", self.stream_key, self.group_name, *self._ids]
+        self._ids = []
+        self._oldest = None
+        return command
+
+    def restore(self, command: List[str]) -> None:
+        """Puts the IDs of a failed XACK back so the next flush retries them."""
+        self._ids[:0] = command[3:]
+        self._oldest = self._oldest or time.monotonic()
+
+    async def flush(self) -> None:
+        command = self.take_command()
+        if command is None:
+            return
+        try:
+            await self.transport.execute(command)
+        except Exception:
+            self.restore(command)
+            raise
+
+    async def read_group(self, read_command: List[str]):
+        """Runs `read_command`, sending any pending XACK in the same round-trip."""
+        ack_command = self.take_command()
+        if ack_command is None:
+            return await self.transport.execute(read_command)
+        try:
+            results = await self.transport.pipeline([ack_command, read_command])
+        except Exception:
+            self.restore(ack_command)
+            raise
+        return results[-1]
+
+    def flush_in_background(self) -> None:
+        """Flushes without awaiting, for paths where the request is already being torn down."""
+        if not self._ids:
+            return
+        task = asyncio.create_task(self._safe_flush())
+        AckBatcher._background.add(task)
+        task.add_done_callback(AckBatcher._background.discard)
+
+    @classmethod
+    async def wait_background(cls) -> None:
+        """Waits for background flushes, so shutdown doesn't drop acks already owed."""
+        if cls._background:
+            await asyncio.gather(*cls._background, return_exceptions=True)
+
+    async def _safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Could not flush stream acks", extra={
+                "stream_key": self.stream_key,
+                "pending_acks": len(self._ids),
+                "error": str(e),
+            })
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+
+from utils.logger import logger
+from api.utils.sse import encode_event
+from api.utils.chunk_protocol import ChunkProtocolError, entry_events
+from api.utils.stream_dispatcher import parse_entry_id
+from api.utils.stream_transport import StreamTransport
+
+
+class CompletedStream:
+    """A finished stream, as (message_id, SSE bytes) pairs ending with END_OF_STREAM."""
+
+    __slots__ = ("entries", "size", "expires_at")
+
+    def __init__(self, entries: List[Tuple[str, bytes]], ttl: float):
+        self.entries = entries
+        self.size = sum(len(event) for _, event in entries)
+        self.expires_at = time.monotonic() + ttl
+
+    def replay(self, after_id: Optional[str] = None, inclusive: bool = False) -> bytes:
+        """SSE bytes for every entry after `after_id` (or from it, if `inclusive`)."""
+        if after_id is None:
+            return b"".join(event for _, event in self.entries)
+        cursor = parse_entry_id(after_id)
+        if inclusive:
+            return b"".join(event for entry_id, event in self.entries if parse_entry_id(entry_id) >= cursor)
+        return b"".join(event for entry_id, event in self.entries if parse_entry_id(entry_id) > cursor)
+
+
+class TerminalStreamCache:
+    """
+    Bounded LRU + TTL cache of streams that already hit END_OF_STREAM.
+
+    Recovering a finished stream is then one cache lookup instead of
+    re-creating the consumer group and polling Redis until the idle timeout.
+    Entries are materialized once per stream (one XRANGE, off the request
+    path) when a consumer sees the end marker. With `redis_copy`, a compact
+    JSON copy is also written to `sse:{stream_id}` so other processes can
+    serve it with a single GET.
+    """
+
+    def __init__(
+        self,
+        transport: StreamTransport,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float = 600,
+        redis_copy: bool = False,
+        max_cursors: int = 10_000,
+    ):
+        self.transport = transport
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.redis_copy = redis_copy
+        self.max_cursors = max_cursors
+        self._streams: "OrderedDict[str, CompletedStream]" = OrderedDict()
+        self._bytes = 0
+        # stream_id -> last message ID a local consumer handed to its client
+        self._cursors: "OrderedDict[str, str]" = OrderedDict()
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def put(self, stream_id: str, entries: List[Tuple[str, bytes]]) -> None:
+        completed = CompletedStream(entries, self.ttl)
+        # One huge answer shouldn't flush everything else out.
+        if completed.size > self.max_bytes // 4:
+            return
+        self._discard(stream_id)
+        self._streams[stream_id] = completed
+        self._bytes += completed.size
+        while self._bytes > self.max_bytes and self._streams:
+            self._discard(next(iter(self._streams)))
+
+    def get(self, stream_id: str) -> Optional[CompletedStream]:
+        completed = self._streams.get(stream_id)
+        if completed is None:
+            return None
+        if completed.expires_at <= time.monotonic():
+            self._discard(stream_id)
+            return None
+        self._streams.move_to_end(stream_id)
+        return completed
+
+    async def lookup(self, stream_id: str) -> Optional[CompletedStream]:
+        """Local cache first, then the Redis copy (if enabled)."""
+        completed = self.get(stream_id)
+        if completed is not None or not self.redis_copy:
+            return completed
+        try:
+            raw = await self.transport.execute(["GET", f"sse:{stream_id}"])
+        except Exception as e:
+            logger.warning("Could not read cached stream copy", extra={"stream_id": stream_id, "error": str(e)})
+            return None
+        if not raw:
+            return None
+        copy = json.loads(raw)
+        if isinstance(copy, dict):
+            # {"v": 1, "entries": [[message_id, sse_text], ...]}
+            entries = [(entry_id, events.encode("utf-8")) for entry_id, events in copy["entries"]]
+        else:
+            # Older copies: [[message_id, chunk], ...]
+            entries = [(entry_id, encode_event(chunk)) for entry_id, chunk in copy]
+        self.put(stream_id, entries)
+        return self.get(stream_id)
+
+    def _discard(self, stream_id: str) -> None:
+        completed = self._streams.pop(stream_id, None)
+        if completed is not None:
+            self._bytes -= completed.size
+
+    def note_delivered(self, stream_id: str, message_id: str) -> None:
+        self._cursors[stream_id] = message_id
+        self._cursors.move_to_end(stream_id)
+        while len(self._cursors) > self.max_cursors:
+            self._cursors.popitem(last=False)
+
+    def delivered_cursor(self, stream_id: str) -> Optional[str]:
+        return self._cursors.get(stream_id)
+
+    def materialize_in_background(self, stream_id: str) -> Optional[asyncio.Task]:
+        if stream_id in self._streams:
+            return None
+        task = asyncio.create_task(self._materialize(stream_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def _materialize(self, stream_id: str) -> None:
+        try:
+            messages = await self.transport.execute(["XRANGE", f"stream:{stream_id}", "-", "+"])
+            entries = []
+            ended = False
+            for message_id, fields in messages or []:
+                try:
+                    events, _, ended = entry_events(fields, message_id)
+                except ChunkProtocolError:
+                    continue
+                if events:
+                    entries.append((message_id, events))
+                if ended:
+                    break
+            if not ended:
+                return
+            self.put(stream_id, entries)
+            if self.redis_copy:
+                copy = {"v": 1, "entries": [[entry_id, events.decode("utf-8")] for entry_id, events in entries]}
+                await self.transport.execute(
+                    ["SET", f"sse:{stream_id}", json.dumps(copy, separators=(",", ":")), "EX", str(int(self.ttl))]
+                )
+        except Exception as e:
+            logger.warning("Could not cache completed stream", extra={"stream_id": stream_id, "error": str(e)})
+
+    async def close(self) -> None:
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
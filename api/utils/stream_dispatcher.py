@@ -0,0 +1,327 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utils.logger import logger
+from api.utils.poll_scheduler import PollScheduler
+from api.utils.stream_transport import StreamTransport
+
+
+def parse_entry_id(entry_id: str) -> Tuple[int, int]:
+    """Turns a Redis stream ID ("1700000000000-3") into a sortable tuple."""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+SLOW_SUBSCRIBER_POLICIES = ("disconnect", "wait")
+
+
+class Subscription:
+    """
+    One SSE connection's view of a stream: a bounded queue, the last ID fanned
+    out to it, and the last ID it actually handed to its client. `overflowed`
+    is set when the dispatcher dropped it for not keeping up.
+    """
+
+    def __init__(self, stream_key: str, last_id: str, maxsize: int = 0):
+        self.stream_key = stream_key
+        self.last_id = last_id
+        self.delivered_id = last_id
+        self.start_id = last_id
+        # What the consumer group's cursor was last set to, and when.
+        self.saved_id = last_id
+        self.saved_at = time.monotonic()
+        self._save: Optional[asyncio.Task] = None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def mark_delivered(self, message_id: str) -> None:
+        self.delivered_id = message_id
+
+    async def get(self, timeout: float, max_messages: int = 10) -> List[list]:
+        """
+        Waits up to `timeout` seconds for the next entry, then drains whatever
+        else is already queued (up to `max_messages`). Returns [] on timeout,
+        and at once if the subscription overflowed and its queue is drained.
+        """
+        if self.overflowed and self.queue.empty():
+            return []
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        messages = [first]
+        while len(messages) < max_messages and not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
+
+
+class StreamDispatcher:
+    """
+    Per-process reader shared by every open SSE connection.
+
+    Instead of one XREADGROUP loop per connection, a single task issues one
+    multi-key XREAD for all subscribed `stream:*` keys and fans the entries
+    out to per-connection queues, so Redis traffic scales with processes
+    rather than with open chats. The task only runs while there are
+    subscribers.
+
+    On transports that can't block, the reads are paced by one schedule of
+    the `PollScheduler` (POLL_* settings and the REDIS_POLL_RPS budget): it
+    learns the cadence of everything the dispatcher reads, taken together,
+    and backs off while nothing arrives. A read that comes back full is
+    followed up at once.
+
+    Each subscriber's queue holds at most `queue_size` entries. When one is
+    full, `slow_subscriber_policy` decides: "disconnect" drops the subscriber
+    (its consumer ends the stream and the client resumes via /api/recover),
+    "wait" leaves the rest in Redis and reads it again for that subscriber
+    once it has room, without holding back the others on the same stream.
+
+    Dispatched entries are read with plain XREAD, so they never enter the
+    consumer group's pending list; the group's cursor is what `/api/recover`
+    resumes from. `checkpoint` moves it up to what the subscriber delivered
+    at most every `cursor_interval` seconds, and `release` once more at the
+    end, so a process that dies mid-stream re-sends at most that much.
+
+    A subscriber that joins while a read is in flight isn't part of it. Its
+    stream is read on the side right away (blocking only until the main read
+    returns), instead of waiting out the main read's BLOCK.
+    """
+
+    def __init__(
+        self,
+        transport: StreamTransport,
+        count: int = 50,
+        block_ms: int = 250,
+        scheduler: Optional[PollScheduler] = None,
+        queue_size: int = 1000,
+        slow_subscriber_policy: str = "disconnect",
+        cursor_interval: float = 1.0,
+    ):
+        assert slow_subscriber_policy in SLOW_SUBSCRIBER_POLICIES
+        self.transport = transport
+        self.count = count
+        self.block_ms = block_ms
+        self.scheduler = scheduler or PollScheduler()
+        self.queue_size = queue_size
+        self.slow_subscriber_policy = slow_subscriber_policy
+        self.cursor_interval = cursor_interval
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        # When the BLOCK of the read in flight runs out (loop time), None between reads.
+        self._read_until: Optional[float] = None
+
+    @property
+    def active_streams(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, stream_key: str, last_id: str = "0-0") -> Subscription:
+        subscription = Subscription(stream_key, last_id, self.queue_size)
+        self._subscriptions.setdefault(stream_key, set()).add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        elif self._read_until is not None or not self.transport.blocking:
+            self._in_background(self._catch_up(subscription))
+        return subscription
+
+    def checkpoint(self, subscription: Subscription, group_name: str) -> None:
+        """Saves the group cursor (in the background) if it moved and the last save is `cursor_interval` old."""
+        if subscription.delivered_id == subscription.saved_id:
+            return
+        if time.monotonic() - subscription.saved_at < self.cursor_interval:
+            return
+        self._save_in_background(subscription, group_name)
+
+    def release(self, subscription: Subscription, group_name: Optional[str] = None) -> None:
+        """
+        Drops a subscription. If `group_name` is given and the subscriber got
+        further than the last checkpoint, the consumer group's cursor is moved
+        up to what it delivered (in the background) so `/api/recover` resumes
+        from the right place.
+        """
+        self._unsubscribe(subscription)
+        if group_name and subscription.delivered_id != subscription.saved_id:
+            self._save_in_background(subscription, group_name)
+
+    def _in_background(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _save_in_background(self, subscription: Subscription, group_name: str) -> None:
+        subscription.saved_id = subscription.delivered_id
+        subscription.saved_at = time.monotonic()
+        # Chained after the previous save, so an older cursor can't land last.
+        subscription._save = asyncio.create_task(
+            self._save_cursor(subscription, group_name, subscription.saved_id, subscription._save)
+        )
+        self._background.add(subscription._save)
+        subscription._save.add_done_callback(self._background.discard)
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscriptions.get(subscription.stream_key)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[subscription.stream_key]
+
+    async def _save_cursor(
+        self, subscription: Subscription, group_name: str, entry_id: str, previous: Optional[asyncio.Task]
+    ) -> None:
+        if previous is not None:
+            await asyncio.wait((previous,))
+        try:
+            await self.transport.execute(["XGROUP", "SETID", subscription.stream_key, group_name, entry_id])
+        except Exception as e:
+            logger.warning("Could not save consumer group cursor", extra={
+                "stream_key": subscription.stream_key,
+                "error": str(e),
+            })
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    async def _catch_up(self, subscription: Subscription) -> None:
+        """Reads a new subscriber's stream once, alongside the read already in flight."""
+        command = ["XREAD", "COUNT", str(self.count)]
+        if self.transport.blocking:
+            if self._read_until is None:
+                return  # between reads: the next one includes it
+            block_ms = int((self._read_until - asyncio.get_running_loop().time()) * 1000)
+            if block_ms > 0:
+                command += ["BLOCK", str(block_ms)]
+        else:
+            await self.scheduler.budget.acquire()
+        cursors = {subscription.stream_key: subscription.last_id}
+        try:
+            response = await self.transport.execute(command + ["STREAMS", subscription.stream_key, subscription.last_id])
+        except Exception as e:
+            logger.warning("Could not read stream for new subscriber", extra={
+                "stream_key": subscription.stream_key,
+                "error": str(e),
+            })
+            return
+        if subscription.stream_key in self._subscriptions:
+            self._fan_out(response, cursors)
+
+    def _read_command(self) -> Tuple[List[str], Dict[str, str]]:
+        """The multi-key XREAD, and the cursor it reads each key from."""
+        cursors = {}
+        for stream_key, subscribers in self._subscriptions.items():
+            # Read from the furthest-behind subscriber with room in its queue; others
+            # skip what they've seen, full ones wait for a read that starts from them.
+            ready = [s.last_id for s in subscribers if not s.queue.full()]
+            if ready:
+                cursors[stream_key] = min(ready, key=parse_entry_id)
+        if not cursors:
+            return [], cursors
+        command = ["XREAD", "COUNT", str(self.count)]
+        if self.transport.blocking:
+            command += ["BLOCK", str(self.block_ms)]
+        return command + ["STREAMS", *cursors.keys(), *cursors.values()], cursors
+
+    def _fan_out(self, response: Any, cursors: Dict[str, str]) -> int:
+        """
+        Hands a read's entries to the subscribers it covers. A subscriber that
+        joined (behind the read's cursor) while the read was in flight would
+        otherwise jump over the entries between its cursor and the read's; it
+        is skipped here and picked up by the next read, which starts from it.
+        """
+        delivered = 0
+        overflowed = []
+        for stream_key, messages in response or []:
+            read_from = cursors.get(stream_key)
+            if read_from is None:
+                continue
+            read_from = parse_entry_id(read_from)
+            for subscription in self._subscriptions.get(stream_key, ()):
+                cursor = parse_entry_id(subscription.last_id)
+                if cursor < read_from:
+                    continue
+                for message in messages:
+                    if parse_entry_id(message[0]) <= cursor:
+                        continue
+                    if subscription.queue.full():
+                        # "wait": last_id stays put, so the rest is read again from there.
+                        if self.slow_subscriber_policy == "disconnect":
+                            overflowed.append(subscription)
+                        break
+                    subscription.queue.put_nowait(message)
+                    subscription.last_id = message[0]
+                    delivered += 1
+        for subscription in overflowed:
+            logger.warning("Stream subscriber fell behind, dropping it", extra={
+                "stream_key": subscription.stream_key,
+                "queued": subscription.queue.qsize(),
+            })
+            subscription.overflowed = True
+            self._unsubscribe(subscription)
+        return delivered
+
+    async def _run(self) -> None:
+        logger.info("Stream dispatcher started", extra={"transport": self.transport.name})
+        schedule = self.scheduler.stream()
+        backlog = False
+        while self._subscriptions:
+            try:
+                if not self.transport.blocking:
+                    if backlog:
+                        await self.scheduler.budget.acquire()
+                    else:
+                        await schedule.wait()
+                command, cursors = self._read_command()
+                if not command:
+                    # Every subscriber's queue is full ("wait"): give them time to drain.
+                    await asyncio.sleep(self.block_ms / 1000)
+                    continue
+                if self.transport.blocking:
+                    self._read_until = asyncio.get_running_loop().time() + self.block_ms / 1000
+                try:
+                    response = await self.transport.execute(command)
+                finally:
+                    self._read_until = None
+                self._fan_out(response, cursors)
+                entries = [messages for _, messages in response or [] if messages]
+                backlog = any(len(messages) >= self.count for messages in entries)
+                if entries:
+                    newest = max(parse_entry_id(messages[-1][0]) for messages in entries)
+                    schedule.on_data(newest[0], sum(len(messages) for messages in entries))
+                else:
+                    schedule.on_empty()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error in stream dispatcher", extra={
+                    "error": str(e),
+                    "error_type": type(e).__name__,
+                    "active_streams": self.active_streams,
+                })
+                await asyncio.sleep(1)
+        logger.info("Stream dispatcher idle, stopping")
+
+
+def create_dispatcher(transport: StreamTransport, scheduler: Optional[PollScheduler] = None) -> Optional[StreamDispatcher]:
+    """Returns the shared dispatcher unless STREAM_DISPATCHER=0."""
+    if os.getenv("STREAM_DISPATCHER", "1").lower() in ("0", "false", "no"):
+        return None
+    return StreamDispatcher(
+        transport,
+        count=int(os.getenv("STREAM_DISPATCHER_COUNT", "50")),
+        block_ms=int(os.getenv("STREAM_DISPATCHER_BLOCK_MS", "250")),
+        scheduler=scheduler,
+        # Entries queued per SSE connection before SLOW_CLIENT_POLICY applies to it
+        queue_size=int(os.getenv("STREAM_SUBSCRIBER_QUEUE", "1000")),
+        slow_subscriber_policy=os.getenv("SLOW_CLIENT_POLICY", "disconnect"),
+        # How often a live stream's consumer group cursor is saved, for /api/recover after a crash
+        cursor_interval=int(os.getenv("STREAM_CURSOR_SAVE_MS", "1000")) / 1000,
+    )
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Awaitable, Dict, List, Optional, Set
+
+from utils.logger import logger
+from api.utils.stream_dispatcher import parse_entry_id
+from api.utils.stream_transport import StreamTransport
+
+
+class StreamLifecycle:
+    """
+    Keeps `stream:{id}` keys (and the consumer groups on them) from piling up.
+
+    - `on_created` gives a stream a TTL as soon as the proxy creates its group,
+      so even an abandoned stream eventually expires.
+    - `retire_in_background` destroys the group once END_OF_STREAM has been
+      delivered and acknowledged. When no other group (another client
+      following the same stream) still reads it, the stream is left to expire
+      after `retire_grace` seconds rather than deleted: a Last-Event-ID
+      resume, a singleflight follower or another worker without the cached
+      copy may still read it just after the end.
+    - `sweep` is a bounded, batched SCAN for streams that slipped through
+      (created before TTLs existed, or written by the backend for a request
+      whose consumer never started): idle ones are deleted, live or empty ones
+      without a TTL get one. It reports how many bytes were reclaimed.
+    """
+
+    def __init__(
+        self,
+        transport: StreamTransport,
+        ttl: int = 3600,
+        retire_on_end: bool = True,
+        retire_grace: int = 60,
+        sweep_idle: int = 3600,
+        sweep_batch: int = 100,
+        sweep_max_keys: int = 2000,
+    ):
+        self.transport = transport
+        self.ttl = ttl
+        self.retire_on_end = retire_on_end
+        self.retire_grace = retire_grace
+        # A stream whose newest entry is older than this (seconds) is orphaned.
+        self.sweep_idle = sweep_idle
+        self.sweep_batch = sweep_batch
+        # Upper bound on keys looked at per sweep, so one cron run stays short.
+        self.sweep_max_keys = sweep_max_keys
+        self._background: Set[asyncio.Task] = set()
+
+    async def on_created(self, stream_key: str) -> None:
+        try:
+            await self.transport.execute(["EXPIRE", stream_key, str(self.ttl)])
+        except Exception as e:
+            logger.warning("Could not set stream TTL", extra={"stream_key": stream_key, "error": str(e)})
+
+    def retire_in_background(self, stream_key: str, group_name: str, after: Optional[Awaitable] = None) -> None:
+        """Drops the group (and expires the stream, if nothing else reads it) once `after` is done."""
+        if not self.retire_on_end:
+            return
+        task = asyncio.create_task(self._retire(stream_key, group_name, after))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _retire(self, stream_key: str, group_name: str, after: Optional[Awaitable]) -> None:
+        try:
+            if after is not None:
+                await after
+            _, groups = await self.transport.pipeline([
+                ["XGROUP", "DESTROY", stream_key, group_name],
+                ["XINFO", "GROUPS", stream_key],
+            ])
+            if not groups:
+                await self.transport.execute(["EXPIRE", stream_key, str(self.retire_grace)])
+        except Exception as e:
+            logger.warning("Could not retire finished stream", extra={"stream_key": stream_key, "error": str(e)})
+
+    async def sweep(self, match: str = "stream:*") -> Dict[str, int]:
+        """One pass over up to `sweep_max_keys` stream keys; returns what it did."""
+        stats = {"scanned": 0, "deleted": 0, "ttl_added": 0, "bytes_reclaimed": 0, "complete": 0}
+        cutoff_ms = int((time.time() - self.sweep_idle) * 1000)
+        cursor = "0"
+        while True:
+            cursor, keys = await self.transport.execute(
+                ["SCAN", cursor, "MATCH", match, "COUNT", str(self.sweep_batch), "TYPE", "stream"]
+            )
+            cursor = str(cursor)
+            if keys:
+                stats["scanned"] += len(keys)
+                await self._sweep_batch(keys, cutoff_ms, stats)
+            if cursor == "0":
+                stats["complete"] = 1
+                break
+            if stats["scanned"] >= self.sweep_max_keys:
+                break
+        return stats
+
+    async def _sweep_batch(self, keys: List[str], cutoff_ms: int, stats: Dict[str, int]) -> None:
+        replies = await self.transport.pipeline(
+            [command for key in keys for command in (["XREVRANGE", key, "+", "-", "COUNT", "1"], ["TTL", key])]
+        )
+        orphaned, without_ttl = [], []
+        for key, newest, ttl in zip(keys, replies[::2], replies[1::2]):
+            if newest and parse_entry_id(newest[0][0])[0] < cutoff_ms:
+                orphaned.append(key)
+            elif int(ttl) == -1:
+                # Includes empty streams: there's no entry to age them by, and a fresh
+                # MKSTREAM one may be between XGROUP CREATE and `on_created`'s EXPIRE.
+                # With a TTL they go on their own if nothing ever writes to them.
+                without_ttl.append(key)
+
+        if orphaned:
+            try:
+                sizes = await self.transport.pipeline([["MEMORY", "USAGE", key] for key in orphaned])
+                stats["bytes_reclaimed"] += sum(int(size or 0) for size in sizes)
+            except Exception as e:
+                # Not every provider exposes MEMORY USAGE; deleting matters more than counting.
+                logger.warning("Could not measure orphaned streams", extra={"error": str(e)})
+            stats["deleted"] += int(await self.transport.execute(["DEL", *orphaned]) or 0)
+        if without_ttl:
+            await self.transport.pipeline([["EXPIRE", key, str(self.ttl)] for key in without_ttl])
+            stats["ttl_added"] += len(without_ttl)
+
+    async def close(self) -> None:
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
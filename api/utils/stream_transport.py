@@ -0,0 +1,131 @@
+import os
+from typing import Any, List, Optional
+
+from utils.logger import logger
+
+
+class StreamTransport:
+    """
+    Thin wrapper around the Redis client used for stream delivery.
+
+    Every transport speaks the Upstash-style `execute([...])` interface and
+    returns Upstash-shaped responses, so callers don't care which backend is
+    behind it. `blocking` tells the consumer whether reads wait server-side
+    (XREADGROUP ... BLOCK) or whether it has to sleep between polls itself.
+    """
+
+    name = "base"
+    blocking = False
+    supports_scripts = True  # EVAL / EVALSHA
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    async def execute(self, command: List) -> Any:
+        return await self.client.execute(command)
+
+    async def pipeline(self, commands: List[List]) -> List[Any]:
+        """Sends several commands in one round-trip where the backend allows it."""
+        return [await self.execute(command) for command in commands]
+
+    def read_group_command(
+        self,
+        group_name: str,
+        consumer_name: str,
+        stream_key: str,
+        last_id: str,
+        count: int = 10,
+        block_ms: Optional[int] = None,
+    ) -> List[str]:
+        command = ["XREADGROUP", "GROUP", group_name, consumer_name, "COUNT", str(count)]
+        if self.blocking and block_ms is not None:
+            command += ["BLOCK", str(block_ms)]
+        return command + ["STREAMS", stream_key, last_id]
+
+    async def read_group(self, *args, **kwargs) -> Any:
+        return await self.execute(self.read_group_command(*args, **kwargs))
+
+    async def close(self) -> None:
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+
+class UpstashTransport(StreamTransport):
+    """Upstash REST. Blocking commands aren't supported, so the consumer polls."""
+
+    name = "upstash"
+
+    async def pipeline(self, commands: List[List]) -> List[Any]:
+        pipe = self.client.pipeline()
+        for command in commands:
+            pipe.execute(command)
+        return await pipe.exec()
+
+
+class RedisTransport(StreamTransport):
+    """A real Redis over TCP (redis-py asyncio), using XREADGROUP BLOCK."""
+
+    name = "redis"
+    blocking = True
+
+    # redis-py reshapes these replies; keep the raw nested lists Upstash returns.
+    RAW_REPLY_COMMANDS = ("XREAD", "XREADGROUP", "XRANGE", "XREVRANGE", "XAUTOCLAIM", "XPENDING", "SCAN")
+
+    def __init__(self, client: Any):
+        super().__init__(client)
+        for command in self.RAW_REPLY_COMMANDS:
+            client.set_response_callback(command, lambda response, **options: response)
+
+    async def execute(self, command: List) -> Any:
+        return await self.client.execute_command(*command)
+
+    async def pipeline(self, commands: List[List]) -> List[Any]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for command in commands:
+                pipe.execute_command(*command)
+            return await pipe.execute()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class MemoryTransport(StreamTransport):
+    """In-process FakeRedis, for offline development and benchmarks."""
+
+    name = "memory"
+    blocking = True
+    supports_scripts = False
+
+    async def pipeline(self, commands: List[List]) -> List[Any]:
+        return await self.client.pipeline(commands)
+
+    async def close(self) -> None:
+        pass
+
+
+def create_transport(kind: Optional[str] = None) -> StreamTransport:
+    """
+    Builds the transport selected by REDIS_TRANSPORT (upstash | redis | memory).
+    Defaults to Upstash, or to a real Redis when REDIS_URL is set.
+    """
+    kind = (kind or os.getenv("REDIS_TRANSPORT") or ("redis" if os.getenv("REDIS_URL") else "upstash")).lower()
+
+    if kind == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("REDIS_TRANSPORT=redis requires the 'redis' package") from e
+        client = redis_asyncio.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        transport = RedisTransport(client)
+    elif kind == "memory":
+        from api.utils.fake_redis import FakeRedis
+        transport = MemoryTransport(FakeRedis())
+    elif kind == "upstash":
+        from upstash_redis.asyncio import Redis as AsyncRedis
+        transport = UpstashTransport(AsyncRedis.from_env())
+    else:
+        raise ValueError(f"Unknown REDIS_TRANSPORT: {kind}")
+
+    logger.info("Stream transport initialised", extra={"transport": transport.name, "blocking": transport.blocking})
+    return transport
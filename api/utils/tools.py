@@ -1,20 +1,126 @@
-import requests
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
-def get_current_weather(latitude, longitude):
-    # Format the URL with proper parameter substitution
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m&hourly=temperature_2m&daily=sunrise,sunset&timezone=auto"
+import httpx
 
-    try:
-        # Make the API call
-        response = requests.get(url)
+from utils.logger import logger
+from api.utils.http_client import http_clients
 
-        # Raise an exception for bad status codes
-        response.raise_for_status()
+WEATHER_URL = os.getenv("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+# Forecasts barely differ within a grid cell (0.1 degrees is ~11 km) or a few minutes.
+WEATHER_GRID_DEGREES = float(os.getenv("WEATHER_GRID_DEGREES", "0.1"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "1024"))
+# Tight, explicit timeouts: a tool call shouldn't hold a chat for the pool defaults.
+WEATHER_TIMEOUT = httpx.Timeout(
+    float(os.getenv("WEATHER_TIMEOUT", "5")),
+    connect=float(os.getenv("WEATHER_CONNECT_TIMEOUT", "2")),
+)
+# WEATHER_MOCK=1 answers from canned data through httpx.MockTransport (offline dev/tests)
+WEATHER_MOCK = os.getenv("WEATHER_MOCK", "0") == "1"
 
-        # Return the JSON response
-        return response.json()
+GridCell = Tuple[float, float]
+
+
+def grid_cell(latitude: float, longitude: float, size: float = WEATHER_GRID_DEGREES) -> GridCell:
+    """Snaps coordinates to the centre of their grid cell; the cache key and the upstream query."""
+    return (
+        round(round(float(latitude) / size) * size, 4),
+        round(round(float(longitude) / size) * size, 4),
+    )
+
+
+def mock_weather_handler(request: httpx.Request) -> httpx.Response:
+    """Deterministic Open-Meteo-shaped forecast for the requested coordinates."""
+    latitude = float(request.url.params["latitude"])
+    longitude = float(request.url.params["longitude"])
+    temperature = round(15 + 10 * math.cos(math.radians(latitude)) + (longitude % 5), 1)
+    return httpx.Response(200, json={
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": "GMT",
+        "current": {"time": "2024-01-01T12:00", "temperature_2m": temperature},
+        "hourly": {"time": [f"2024-01-01T{hour:02d}:00" for hour in range(24)], "temperature_2m": [temperature] * 24},
+        "daily": {"time": ["2024-01-01"], "sunrise": ["2024-01-01T07:00"], "sunset": ["2024-01-01T17:00"]},
+    })
+
+
+class WeatherCache:
+    """
+    TTL + LRU cache of forecasts per grid cell, with in-flight deduplication.
+
+    Concurrent lookups for the same cell wait on the one upstream request
+    already running instead of sending their own; a caller that goes away
+    doesn't cancel it for the others. Failures aren't cached.
+    """
+
+    def __init__(self, ttl: float = WEATHER_CACHE_TTL, max_entries: int = WEATHER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[GridCell, Tuple[float, dict]]" = OrderedDict()
+        self._in_flight: Dict[GridCell, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, cell: GridCell, fetch) -> Optional[dict]:
+        entry = self._entries.get(cell)
+        if entry is not None:
+            expires, forecast = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(cell)
+                self.hits += 1
+                return forecast
+            del self._entries[cell]
 
-    except requests.RequestException as e:
-        # Handle any errors that occur during the request
-        print(f"Error fetching weather data: {e}")
+        task = self._in_flight.get(cell)
+        if task is None:
+            self.misses += 1
+            task = self._in_flight[cell] = asyncio.create_task(fetch(cell))
+            task.add_done_callback(lambda done: self._store(cell, done))
+        return await asyncio.shield(task)
+
+    def _store(self, cell: GridCell, task: asyncio.Task) -> None:
+        self._in_flight.pop(cell, None)
+        if task.cancelled() or task.exception() is not None or task.result() is None:
+            return
+        self._entries[cell] = (time.monotonic() + self.ttl, task.result())
+        self._entries.move_to_end(cell)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+weather_cache = WeatherCache()
+
+
+def weather_client() -> httpx.AsyncClient:
+    if WEATHER_MOCK:
+        return http_clients.client("weather", transport=httpx.MockTransport(mock_weather_handler))
+    return http_clients.client("weather")
+
+
+async def fetch_weather(cell: GridCell) -> Optional[dict]:
+    latitude, longitude = cell
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current": "temperature_2m",
+        "hourly": "temperature_2m",
+        "daily": "sunrise,sunset",
+        "timezone": "auto",
+    }
+    try:
+        response = await weather_client().get(WEATHER_URL, params=params, timeout=WEATHER_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Error fetching weather data", extra={"latitude": latitude, "longitude": longitude, "error": str(e)})
         return None
+
+
+async def get_current_weather(latitude, longitude) -> Optional[dict]:
+    """Open-Meteo forecast for the grid cell around the coordinates, or None if it can't be fetched."""
+    return await weather_cache.get(grid_cell(latitude, longitude), fetch_weather)
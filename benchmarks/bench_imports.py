@@ -0,0 +1,111 @@
+"""
+Cold-start profile for the serverless entry point.
+
+Imports `api.index` in fresh interpreters (as a Vercel cold start does) and
+reports the wall-clock import time, plus the slowest modules from
+`python -X importtime` so a regression points at its cause. Runs both the
+default startup and `LAZY_STARTUP=1` unless `--mode` picks one. Use
+`--max-ms` to fail (exit 1) when the median import of the checked mode is
+slower than a budget.
+
+    python benchmarks/bench_imports.py [--runs 5] [--top 15]
+    SENTRY_DSN=https://key@example.invalid/1 python benchmarks/bench_imports.py --mode lazy --max-ms 600
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "default": {"LAZY_STARTUP": "0"},
+    "lazy": {"LAZY_STARTUP": "1"},
+}
+
+TIMER = (
+    "import time; started = time.perf_counter(); import api.index; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def run_env(mode):
+    env = dict(os.environ)
+    env.setdefault("REDIS_TRANSPORT", "memory")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    # Keep the cached bytecode: a deployed function has its .pyc files already.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env.update(MODES[mode])
+    return env
+
+
+def time_import(mode):
+    result = subprocess.run(
+        [sys.executable, "-c", TIMER], cwd=ROOT, env=run_env(mode),
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_modules(mode, top):
+    """Modules with the largest cumulative import time, nesting depth included."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.index"], cwd=ROOT, env=run_env(mode),
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(cumulative_us), depth, name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "depth": depth, "cumulative_ms": round(us / 1000, 1)} for us, depth, name in rows[:top]]
+
+
+def profile(mode, runs, top):
+    time_import(mode)  # warm the bytecode cache
+    samples = [time_import(mode) for _ in range(runs)]
+    return {
+        "mode": mode,
+        "runs": runs,
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+        "slowest": slowest_modules(mode, top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per mode")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--mode", choices=sorted(MODES), help="profile only this mode")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-ms", type=float, help="fail if the median import exceeds this many ms")
+    args = parser.parse_args()
+
+    modes = [args.mode] if args.mode else list(MODES)
+    reports = [profile(mode, args.runs, args.top) for mode in modes]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print(f"{report['mode']:>8}: import api.index median {report['median_ms']:.1f} ms "
+                  f"(min {report['min_ms']:.1f}, max {report['max_ms']:.1f}, {report['runs']} runs)")
+            for row in report["slowest"]:
+                print(f"          {row['cumulative_ms']:8.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+    if args.max_ms is not None:
+        checked = reports[-1]
+        if checked["median_ms"] > args.max_ms:
+            print(f"FAIL: {checked['mode']} import median {checked['median_ms']:.1f} ms > {args.max_ms:.1f} ms", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
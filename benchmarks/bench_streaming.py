@@ -0,0 +1,295 @@
+"""
+Offline load test for the chat streaming path.
+
+Drives `POST /api/chat` on the FastAPI app directly over ASGI (no sockets,
+no network), so the whole hot path runs: rate limit -> sanitize ->
+`trigger_stream_generation` -> `consume_stream_from_redis`. The backend is a
+stub behind an `httpx.MockTransport` that, like the real one, returns right
+away and then writes chunks into the stream at a fixed token rate. Redis is
+the in-memory fake by default, or a local Redis with `--transport redis`.
+
+Reports time to first token, inter-chunk gaps, Redis commands per delivered
+message (producer writes excluded, reported as stream entries) and CPU / memory per connection. Use the
+`--max-*` options to fail (exit 1) when a run regresses past a budget.
+
+    python benchmarks/bench_streaming.py [--clients 100] [--chunks 40] [--rate 50]
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_streaming.py --transport redis
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKEND_URL = "http://backend.invalid/generate"
+END_OF_STREAM = "[END_OF_STREAM]"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values, scale=1000.0):
+    """p50/p95/p99/max, in ms by default."""
+    return {
+        "p50": round(percentile(values, 50) * scale, 2),
+        "p95": round(percentile(values, 95) * scale, 2),
+        "p99": round(percentile(values, 99) * scale, 2),
+        "max": round(max(values, default=0) * scale, 2),
+    }
+
+
+class CommandCounter:
+    """Counts commands the app sends through the shared transport."""
+
+    def __init__(self, transport):
+        self.count = 0
+        self.raw_execute = transport.execute
+        self.raw_pipeline = transport.pipeline
+
+        async def execute(command):
+            self.count += 1
+            return await self.raw_execute(command)
+
+        async def pipeline(commands):
+            self.count += len(commands)
+            return await self.raw_pipeline(commands)
+
+        transport.execute = execute
+        transport.pipeline = pipeline
+
+
+class StubBackend:
+    """Accepts a generation request and writes the answer into Redis in the background."""
+
+    def __init__(self, write, chunks, rate, first_token_delay, protocol="chunk", batch_ms=50.0):
+        self.write = write
+        self.chunks = chunks
+        self.interval = 1 / rate if rate > 0 else 0
+        self.first_token_delay = first_token_delay
+        self.protocol = protocol
+        self.batch_ms = batch_ms
+        self.tasks = set()
+        self.calls = 0
+        self.entries = 0
+
+    async def handle(self, request):
+        import httpx
+
+        self.calls += 1
+        stream_id = json.loads(request.content)["stream_id"]
+        task = asyncio.create_task(self.generate(stream_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return httpx.Response(200, json={"status": "accepted", "stream_id": stream_id})
+
+    async def generate(self, stream_id):
+        stream_key = f"stream:{stream_id}"
+        await asyncio.sleep(self.first_token_delay)
+        if self.protocol == "v1":
+            await self.generate_batches(stream_key)
+            return
+        for index in range(self.chunks):
+            await self.xadd(stream_key, "chunk", f"token-{index} ")
+            if self.interval:
+                await asyncio.sleep(self.interval)
+        await self.xadd(stream_key, "chunk", END_OF_STREAM)
+
+    async def xadd(self, stream_key, *fields):
+        self.entries += 1
+        await self.write(["XADD", stream_key, "*", *fields])
+
+    async def generate_batches(self, stream_key):
+        """Version 1 entries: the first token alone, then whatever piled up every `batch_ms`."""
+        from api.utils.chunk_protocol import batch_fields
+
+        loop = asyncio.get_running_loop()
+        batch, flushed_at = [], None
+        for index in range(self.chunks):
+            batch.append(f"token-{index} ")
+            now = loop.time()
+            if flushed_at is None or (now - flushed_at) * 1000 >= self.batch_ms:
+                await self.xadd(stream_key, *batch_fields(batch))
+                batch, flushed_at = [], now
+            if self.interval:
+                await asyncio.sleep(self.interval)
+        await self.xadd(stream_key, *batch_fields(batch, end=True))
+
+
+async def sse_client(app, index, content):
+    """One chat request over raw ASGI; returns (ttft, gaps, messages, status)."""
+    body = json.dumps({"content": content, "thread_id": f"bench-{index}"}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/chat",
+        "raw_path": b"/api/chat",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"bench")],
+        # One address per client so the per-IP rate limit doesn't kick in.
+        "client": (f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}", 50000),
+        "server": ("bench", 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    started = time.perf_counter()
+    arrivals, messages, status = [], 0, None
+
+    async def send(message):
+        nonlocal messages, status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            data = message.get("body", b"")
+            if data:
+                arrivals.append(time.perf_counter())
+                # Tokens plus the end marker, however the proxy grouped them into events.
+                messages += data.count(b"token-") + data.count(END_OF_STREAM.encode())
+            if not message.get("more_body", False):
+                disconnected.set()
+
+    await app(scope, receive, send)
+    ttft = arrivals[0] - started if arrivals else None
+    gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+    return ttft, gaps, messages, status
+
+
+async def run(args):
+    import api.index as index
+
+    transport = index.redis
+    counter = CommandCounter(transport)
+    backend = StubBackend(counter.raw_execute, args.chunks, args.rate, args.first_token_delay, args.protocol, args.batch_ms)
+
+    import httpx
+    from api.utils.http_client import http_clients
+
+    http_clients.client("backend", transport=httpx.MockTransport(backend.handle))
+
+    # Warm-up request so imports, pools and script loading aren't measured.
+    await sse_client(index.app, 1_000_000, "warm up")
+    counter.count = 0
+    backend.calls = 0
+    backend.entries = 0
+
+    if args.trace_memory:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+
+    results = await asyncio.gather(*[
+        sse_client(index.app, client, "benchmark question" if args.same_prompt else f"benchmark question {client}")
+        for client in range(args.clients)
+    ])
+
+    wall = time.perf_counter() - wall_before
+    # Let post-stream work (caching, retiring the stream) finish so its commands are counted.
+    await index.stream_cache.close()
+    await index.stream_lifecycle.close()
+    cpu = time.process_time() - cpu_before
+    rss_growth_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    ttfts = [ttft for ttft, _, _, _ in results if ttft is not None]
+    gaps = [gap for _, client_gaps, _, _ in results for gap in client_gaps]
+    messages = sum(count for _, _, count, _ in results)
+    ok = sum(1 for _, _, count, status in results if status == 200 and count == args.chunks + 1)
+
+    report = {
+        "transport": transport.name,
+        "dispatcher": index.dispatcher is not None,
+        "clients": args.clients,
+        "chunks_per_stream": args.chunks,
+        "protocol": args.protocol,
+        "tokens_per_second": args.rate,
+        "complete_streams": ok,
+        "backend_generations": backend.calls,
+        "stream_entries_per_stream": round(backend.entries / max(1, backend.calls), 2),
+        "wall_seconds": round(wall, 3),
+        "ttft_ms": summarize(ttfts),
+        "chunk_gap_ms": summarize(gaps),
+        "redis_commands": counter.count,
+        "redis_commands_per_message": round(counter.count / messages, 3) if messages else None,
+        "cpu_ms_per_connection": round(cpu * 1000 / args.clients, 3),
+        "rss_growth_kb_per_connection": round(rss_growth_kb / args.clients, 2),
+    }
+    if traced_peak is not None:
+        report["traced_peak_kb_per_connection"] = round(traced_peak / 1024 / args.clients, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100, help="concurrent SSE clients")
+    parser.add_argument("--chunks", type=int, default=40, help="chunks per answer (plus END_OF_STREAM)")
+    parser.add_argument("--rate", type=float, default=50, help="tokens per second per stream (0 = as fast as possible)")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="stub backend delay before the first chunk (s)")
+    parser.add_argument("--protocol", choices=["chunk", "v1"], default="chunk",
+                        help="stream entry format the stub backend writes (see api/utils/chunk_protocol.py)")
+    parser.add_argument("--batch-ms", type=float, default=50, help="v1: batch tokens written within this window")
+    parser.add_argument("--same-prompt", action="store_true", help="every client asks the same question (see SINGLEFLIGHT)")
+    parser.add_argument("--transport", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peak (slower)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-ttft-p95", type=float, help="fail if TTFT p95 exceeds this many ms")
+    parser.add_argument("--max-gap-p99", type=float, help="fail if the inter-chunk p99 exceeds this many ms")
+    parser.add_argument("--max-commands-per-message", type=float, help="fail above this many Redis commands per message")
+    args = parser.parse_args()
+
+    # Configure the app before it is imported: stub backend, chosen Redis, quiet logs.
+    os.environ["REDIS_TRANSPORT"] = args.transport
+    os.environ["API_URL"] = BACKEND_URL
+    os.environ["API_KEY"] = "bench"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:32} {value}")
+
+    failures = []
+    if args.max_ttft_p95 is not None and report["ttft_ms"]["p95"] > args.max_ttft_p95:
+        failures.append(f"TTFT p95 {report['ttft_ms']['p95']}ms > {args.max_ttft_p95}ms")
+    if args.max_gap_p99 is not None and report["chunk_gap_ms"]["p99"] > args.max_gap_p99:
+        failures.append(f"chunk gap p99 {report['chunk_gap_ms']['p99']}ms > {args.max_gap_p99}ms")
+    if (
+        args.max_commands_per_message is not None
+        and (report["redis_commands_per_message"] or 0) > args.max_commands_per_message
+    ):
+        failures.append(f"{report['redis_commands_per_message']} Redis commands/message > {args.max_commands_per_message}")
+    if report["complete_streams"] != args.clients:
+        failures.append(f"only {report['complete_streams']}/{args.clients} streams completed")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
   const controllerRef = useRef<AbortController | null>(null);
   const timeoutRef = useRef<number | null>(null);
   const streamIdRef = useRef<string | null>(null); // To store the unique ID for recovery
+  const lastEventIdRef = useRef<string | null>(null); // SSE `id:` of the last event received, for exact resume
 
   /**
    * Resets the inactivity watchdog timeout.
@@ -44,6 +45,7 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
     const decoder = new TextDecoder();
     let buf = '';
     let streamStarted = false;
+    let recoverId: string | null = null;
 
     for (;;) {
       const { done, value } = await reader.read();
@@ -78,6 +80,10 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
         const line = buf.slice(0, i).trim();
         buf = buf.slice(i + 1);
         if (!line) continue;
+        if (line.startsWith('id:')) {
+          lastEventIdRef.current = line.slice(3).trim();
+          continue;
+        }
         if (line.startsWith('data:')) {
           try {
             const chunk = String(line.slice(6));
@@ -101,6 +107,10 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
                 appendNewline();
                 setBusy(false);
                 return; // End the stream gracefully
+              } else if (chunk.startsWith('[Recover:')) {
+                // The server is shutting down mid-answer (rolling deploy): pick the
+                // stream up again via /api/recover on whichever instance answers.
+                recoverId = chunk.slice('[Recover:'.length, -1).trim() || streamIdRef.current;
               } else if (chunk === '[END_OF_STREAM]') {
                 // Normal end of stream
                 setBusy(false);
@@ -114,6 +124,21 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
             // ignore bad chunk
           }
         }
+        if (recoverId) break;
+      }
+      if (recoverId) {
+        try {
+          await reader.cancel();
+        } catch {
+          // The server is closing this connection anyway
+        }
+        // Recovery has no watchdog of its own; don't let this one abort it.
+        if (timeoutRef.current) {
+          clearTimeout(timeoutRef.current);
+          timeoutRef.current = null;
+        }
+        await recoverStream(recoverId);
+        return;
       }
     }
   }
@@ -133,7 +158,11 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
       // Call the new GET endpoint for recovery using the unique stream_id.
       const res = await fetch(`/api/recover/${streamId}`, {
         method: 'GET',
-        headers: { 'Accept': 'text/event-stream' },
+        headers: {
+          'Accept': 'text/event-stream',
+          // Resume right after the last event we got, instead of relying on server-side state.
+          ...(lastEventIdRef.current ? { 'Last-Event-ID': lastEventIdRef.current } : {}),
+        },
         signal: controller.signal,
         cache: 'no-store',
       });
@@ -166,6 +195,7 @@ export function useChatStream({ appendText, appendPrefix, appendNewline, setStar
 
     const controller = new AbortController();
     controllerRef.current = controller;
+    lastEventIdRef.current = null;
 
     // Start the watchdog timer. It will be reset each time data arrives.
     resetTimeout();
@@ -0,0 +1,83 @@
+"""
+Production entry point for the FastAPI proxy: several uvicorn workers on
+uvloop + httptools with a graceful drain on SIGTERM.
+
+    python server.py            # WEB_CONCURRENCY workers, default: one per available core
+
+On SIGTERM (rolling deploy, `docker stop`) each worker stops accepting
+connections and gives in-flight SSE streams DRAIN_TIMEOUT seconds: streams
+that finish in time end normally, the rest are sent a recover hint with
+their stream_id so the client resumes on another instance via
+/api/recover/{stream_id}. Lives outside api/ so Vercel doesn't deploy it as
+a function.
+"""
+import importlib.util
+import os
+import sys
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from utils.logger import logger
+
+# Seconds uvicorn waits for open connections on shutdown. Streams get most of it and
+# send their recover hint DRAIN_MARGIN earlier: a consumer notices the deadline only
+# between reads, which can block for STREAM_BLOCK_MS.
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "25"))
+DRAIN_MARGIN = float(os.getenv("DRAIN_MARGIN", "5"))
+
+
+def worker_count() -> int:
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    try:
+        # Respects CPU affinity / container cpusets, unlike os.cpu_count().
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that starts the stream drain on the first shutdown signal."""
+
+    def handle_exit(self, sig, frame) -> None:
+        if not self.should_exit:
+            from api.utils.drain import drain
+
+            drain.start(DRAIN_TIMEOUT - DRAIN_MARGIN)
+            logger.info("Shutdown signal received, draining streams", extra={"signal": sig, "pid": os.getpid()})
+        super().handle_exit(sig, frame)
+
+
+def main() -> None:
+    workers = worker_count()
+    config = uvicorn.Config(
+        "api.index:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        lifespan="on",
+        timeout_graceful_shutdown=DRAIN_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.getenv("ACCESS_LOG", "0") == "1",
+    )
+    server = DrainingServer(config=config)
+    logger.info("Starting API server", extra={"workers": workers, "loop": config.loop, "http": config.http})
+    try:
+        if workers > 1:
+            sock = config.bind_socket()
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+    if workers == 1 and not server.started:
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# api.index picks its Redis transport at import time; tests run against the in-memory fake.
+os.environ.setdefault("REDIS_TRANSPORT", "memory")
+
+from api.utils.fake_redis import FakeRedis  # noqa: E402
+from api.utils.stream_transport import MemoryTransport  # noqa: E402
+from helpers import Clock  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def run():
+    """
+    Runs coroutines on one event loop for the whole session: api.index keeps
+    module-level state (the fake Redis, the dispatcher task) bound to a loop.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def transport():
+    """A fresh in-memory Redis, for tests that don't go through api.index."""
+    return MemoryTransport(FakeRedis())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock moved by hand; `clock.install(module)` makes it that module's `time`."""
+    return Clock(monkeypatch)
@@ -0,0 +1,56 @@
+"""Request builders, SSE readers and a fake clock shared by the tests."""
+import json
+
+from starlette.requests import Request
+
+
+def get_request(headers=None):
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def chat_request(content, client_host, thread_id="thread-1"):
+    body = json.dumps({"content": content, "thread_id": thread_id}).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({
+        "type": "http", "method": "POST", "path": "/api/chat", "query_string": b"",
+        "headers": [(b"content-type", b"application/json")], "client": (client_host, 1234),
+    }, receive)
+
+
+async def read_body(response):
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return b"".join(chunks)
+
+
+def sse_data(payload):
+    """The `data:` values of an SSE body, concatenated."""
+    return b"".join(line[len(b"data: "):] for line in payload.split(b"\n") if line.startswith(b"data: "))
+
+
+class Clock:
+    """Stands in for the `time` module of the code under test: `clock.now += seconds` moves it."""
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.now = 1000.0
+        self.sleeps = []
+
+    def install(self, module):
+        self.monkeypatch.setattr(module, "time", self)
+        return self
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        """An `asyncio.sleep` that moves the clock instead of waiting."""
+        self.sleeps.append(seconds)
+        self.now += seconds
@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import api.index as index
+from api.utils.circuit_breaker import CircuitBreaker
+
+
+def backend(monkeypatch, outcome):
+    """Points the trigger at a mock backend that fails with `outcome`; returns the POSTs it saw."""
+    posts = []
+
+    def handler(request):
+        posts.append(request)
+        if isinstance(outcome, int):
+            return httpx.Response(outcome)
+        raise outcome("simulated", request=request)
+
+    monkeypatch.setattr(index, "backend_url", "http://backend.invalid/generate")
+    monkeypatch.setattr(index, "backend_api_key", "test-key")
+    monkeypatch.setattr(index, "backend_breaker", CircuitBreaker("backend"))
+    monkeypatch.setitem(index.http_clients._clients, "backend", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return posts
+
+
+@pytest.mark.parametrize("outcome", [httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, 429, 503])
+def test_failures_before_the_backend_got_the_request_are_retried(monkeypatch, run, outcome):
+    posts = backend(monkeypatch, outcome)
+    with pytest.raises(HTTPException):
+        run(index.trigger_stream_generation("thread-1", f"retry-{outcome}", {"content": "hi"}))
+    assert len(posts) == index.BACKEND_RETRIES + 1
+
+
+@pytest.mark.parametrize("outcome", [httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.WriteError, 502, 504])
+def test_failures_that_may_have_started_a_generation_are_not_retried_by_default(monkeypatch, run, outcome):
+    posts = backend(monkeypatch, outcome)
+    with pytest.raises(HTTPException):
+        run(index.trigger_stream_generation("thread-1", f"no-retry-{outcome}", {"content": "hi"}))
+    assert len(posts) == 1
+
+
+@pytest.mark.parametrize("outcome", [httpx.ReadTimeout, 504])
+def test_ambiguous_failures_are_retried_when_opted_in(monkeypatch, run, outcome):
+    monkeypatch.setattr(index, "BACKEND_RETRY_AMBIGUOUS", True)
+    posts = backend(monkeypatch, outcome)
+    with pytest.raises(HTTPException):
+        run(index.trigger_stream_generation("thread-1", f"opt-in-{outcome}", {"content": "hi"}))
+    assert len(posts) == index.BACKEND_RETRIES + 1
@@ -0,0 +1,45 @@
+import pytest
+
+from api.utils.chunk_protocol import (
+    DATA,
+    END,
+    ERROR,
+    HEARTBEAT,
+    ChunkProtocolError,
+    batch_fields,
+    decode_frames,
+    encode_frames,
+    entry_events,
+)
+
+
+def test_frames_round_trip_with_multibyte_and_colons():
+    frames = [(DATA, "Hello"), (DATA, " wörld: 🙂"), (HEARTBEAT, ""), (ERROR, "a:b"), (END, "")]
+    payload = encode_frames(frames)
+    assert decode_frames(payload) == [(kind, body.encode()) for kind, body in frames]
+    assert decode_frames(payload.encode()) == decode_frames(payload)
+
+
+def test_batch_becomes_one_data_event_then_the_end():
+    events, data_frames, ended = entry_events(batch_fields(["a", "b"], end=True))
+    assert events == b"data: ab\n\ndata: [END_OF_STREAM]\n\n"
+    assert (data_frames, ended) == (2, True)
+
+
+@pytest.mark.parametrize("payload", ["1D5:Hell", "1D5", "1D", "1D5:HelloD"])
+def test_truncated_payloads_are_rejected(payload):
+    with pytest.raises(ChunkProtocolError):
+        decode_frames(payload)
+
+
+@pytest.mark.parametrize("length", ["-4", "+4", " 4", "4_0", "", "٤"])
+def test_lengths_other_than_ascii_digits_are_rejected(length):
+    # "1D-4:" used to parse as a negative length and never advance.
+    with pytest.raises(ChunkProtocolError):
+        decode_frames(f"1D{length}:abcd")
+
+
+@pytest.mark.parametrize("payload", ["1Q0:", "1D1:aZ0:", "2D1:a"])
+def test_unknown_frame_types_and_versions_are_rejected(payload):
+    with pytest.raises(ChunkProtocolError):
+        decode_frames(payload)
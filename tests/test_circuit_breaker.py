@@ -0,0 +1,103 @@
+import httpx
+import pytest
+
+import api.index as index
+from api.utils import circuit_breaker
+from api.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(clock):
+    return clock.install(circuit_breaker)
+
+
+def call(breaker, failed=False, duration=0.1):
+    breaker.before_call()
+    breaker.record(duration, failed=failed)
+
+
+def tripped(breaker):
+    for failed in (True, False, True, True):
+        call(breaker, failed=failed)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_on_failure_rate_once_enough_calls_are_in_the_window(clock):
+    breaker = CircuitBreaker("test", min_calls=4, failure_rate=0.5)
+    for _ in range(3):
+        call(breaker, failed=True)
+    assert breaker.state == CLOSED
+    call(breaker, failed=False)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = CircuitBreaker("test", min_calls=2, slow_call_seconds=1, slow_call_rate=1.0)
+    call(breaker, duration=2)
+    call(breaker, duration=3)
+    assert breaker.state == OPEN
+
+
+def test_old_failures_fall_out_of_the_window(clock):
+    breaker = CircuitBreaker("test", window=10, min_calls=4, failure_rate=0.5)
+    for _ in range(3):
+        call(breaker, failed=True)
+    clock.now += 11
+    call(breaker, failed=True)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_the_open_period_then_closed_by_a_good_probe(clock):
+    breaker = tripped(CircuitBreaker("test", min_calls=4, open_seconds=15))
+    clock.now += 14
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 1
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only `half_open_calls` probes at a time.
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(0.1, failed=False)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["calls"] == 0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = tripped(CircuitBreaker("test", min_calls=4, open_seconds=15))
+    clock.now += 15
+    call(breaker, failed=True)
+    assert breaker.state == OPEN
+    assert breaker.retry_after == 15
+
+
+def test_cancelled_probe_frees_its_slot(clock):
+    breaker = tripped(CircuitBreaker("test", min_calls=4, open_seconds=15))
+    clock.now += 15
+    breaker.before_call()
+    breaker.cancel()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_unexpected_backend_error_still_reports_the_probe(monkeypatch, run, clock):
+    def handler(request):
+        raise ValueError("not a transport error")
+
+    breaker = tripped(CircuitBreaker("backend", min_calls=4, open_seconds=15))
+    clock.now += 15
+    monkeypatch.setattr(index, "backend_url", "http://backend.invalid/generate")
+    monkeypatch.setattr(index, "backend_breaker", breaker)
+    monkeypatch.setitem(index.http_clients._clients, "backend", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    with pytest.raises(ValueError):
+        run(index.backend_post({}, {}))
+    # The probe counted as a failure instead of holding the only half-open slot forever.
+    assert breaker.state == OPEN
+    clock.now += 15
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,63 @@
+import asyncio
+
+from starlette.requests import Request
+
+from api.utils import sse
+from api.utils.client_stream import ClientStreamingResponse
+
+
+async def connected():
+    # A client that never disconnects; is_disconnected() polls this with a zero timeout.
+    await asyncio.Event().wait()
+
+
+def source(closed):
+    async def events():
+        try:
+            for index in range(100):
+                yield f"data: {index}\n\n".encode()
+        finally:
+            closed.append(True)
+
+    return events()
+
+
+def test_slow_client_cut_off_mid_send_closes_the_body_generator(run):
+    closed = []
+    sends = []
+
+    async def send(message):
+        sends.append(message)
+        if len(sends) > 2:
+            await asyncio.Event().wait()  # the client stopped reading
+
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []}, connected)
+    response = ClientStreamingResponse(source(closed), request, stall_timeout=0.05, poll_interval=0.02)
+    run(asyncio.wait_for(response({"type": "http", "path": "/"}, connected, send), 2))
+    # Closed before __call__ returned, not left for the garbage collector.
+    assert closed == [True]
+
+
+def test_pass_through_coalesce_closes_its_source(run):
+    closed = []
+
+    async def first_event():
+        events = sse.coalesce(source(closed), window=0)
+        event = await events.__anext__()
+        await events.aclose()
+        return event
+
+    assert run(first_event()) == b"data: 0\n\n"
+    assert closed == [True]
+
+
+def test_coalesce_merges_events_within_the_window(run):
+    closed = []
+
+    async def writes():
+        return [write async for write in sse.coalesce(source(closed), window=0.05, max_bytes=64)]
+
+    merged = run(writes())
+    assert b"".join(merged) == b"".join(f"data: {index}\n\n".encode() for index in range(100))
+    assert len(merged) < 100
+    assert closed == [True]
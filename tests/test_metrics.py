@@ -0,0 +1,28 @@
+import pytest
+from fastapi import HTTPException
+
+import api.index as index
+from helpers import get_request
+
+
+def test_metrics_are_off_without_a_token(monkeypatch, run):
+    monkeypatch.setattr(index, "METRICS_TOKEN", None)
+    with pytest.raises(HTTPException) as error:
+        run(index.metrics_endpoint(get_request()))
+    assert error.value.status_code == 404
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong", "Bearer sécret"])
+def test_metrics_need_the_bearer_token(monkeypatch, run, authorization):
+    monkeypatch.setattr(index, "METRICS_TOKEN", "secret")
+    headers = {"Authorization": authorization} if authorization else {}
+    with pytest.raises(HTTPException) as error:
+        run(index.metrics_endpoint(get_request(headers)))
+    assert error.value.status_code == 401
+
+
+def test_metrics_with_the_token(monkeypatch, run):
+    monkeypatch.setattr(index, "METRICS_TOKEN", "secret")
+    response = run(index.metrics_endpoint(get_request({"Authorization": "Bearer secret"})))
+    assert response.status_code == 200
+    assert b"# TYPE" in response.body
@@ -0,0 +1,108 @@
+import types
+
+import pytest
+
+from api.utils import poll_scheduler
+from api.utils.poll_scheduler import PollBudget, PollScheduler
+
+
+@pytest.fixture
+def clock(monkeypatch, clock):
+    """Time and asyncio.sleep for the scheduler, both on the fake clock."""
+    clock.install(poll_scheduler)
+    monkeypatch.setattr(poll_scheduler, "asyncio", types.SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+# Rates are powers of two, so the fake clock's arithmetic is exact.
+
+
+def test_budget_allows_a_burst_then_paces_at_its_rate(run, clock):
+    budget = PollBudget(rate=8, burst=3)
+
+    async def polls(count):
+        for _ in range(count):
+            await budget.acquire()
+
+    started = clock.now
+    run(polls(3))
+    assert clock.now == started
+    run(polls(8))
+    assert clock.now - started == 1.0
+
+
+def test_budget_refills_while_idle(run, clock):
+    budget = PollBudget(rate=8, burst=2)
+    run(budget.acquire())
+    run(budget.acquire())
+    clock.now += 10  # far longer than a refill, but the bucket holds `burst`
+    run(budget.acquire())
+    run(budget.acquire())
+    assert clock.sleeps == []
+    run(budget.acquire())
+    assert clock.sleeps == [0.125]
+
+
+def test_unlimited_budget_never_waits(run, clock):
+    budget = PollBudget(rate=0)
+    for _ in range(1000):
+        run(budget.acquire())
+    assert clock.sleeps == []
+
+
+def scheduler(**options):
+    settings = dict(min_interval=0.05, max_interval=2.0, first_token_interval=0.15, jitter=0, smoothing=0.5)
+    return PollScheduler(**{**settings, **options})
+
+
+def test_polls_steadily_until_the_first_token():
+    schedule = scheduler().stream()
+    for _ in range(5):
+        schedule.on_empty()
+    assert schedule.interval == 0.15
+
+
+def test_learns_the_cadence_from_entry_ids():
+    schedule = scheduler(cadence_factor=1.0).stream()
+    schedule.on_data(1_000_000)
+    assert schedule.interval == 0.05  # one entry says nothing about the cadence yet
+    schedule.on_data(1_000_400, count=2)  # 200 ms per entry
+    assert schedule.cadence == pytest.approx(0.2)
+    assert schedule.interval == pytest.approx(0.2)
+    schedule.on_data(1_000_500)  # 100 ms, smoothed halfway
+    assert schedule.cadence == pytest.approx(0.15)
+
+    fast = scheduler().stream()
+    fast.on_data(1_000_000)
+    fast.on_data(1_000_001, count=10)
+    assert fast.interval == 0.05  # not below min_interval
+
+
+def test_backs_off_when_idle_up_to_the_max():
+    schedule = scheduler(backoff=2.0, max_interval=1.0).stream()
+    schedule.on_data(1_000_000)
+    schedule.on_data(1_000_100)
+    intervals = []
+    for _ in range(6):
+        schedule.on_empty()
+        intervals.append(round(schedule.interval, 3))
+    assert intervals == [0.2, 0.4, 0.8, 1.0, 1.0, 1.0]
+
+
+def test_jitter_spreads_delays_within_bounds(monkeypatch):
+    schedule = scheduler(jitter=0.2).stream()
+    delays = {schedule.next_delay() for _ in range(200)}
+    assert all(0.12 <= delay <= 0.18 for delay in delays)
+    assert len(delays) > 100
+
+    monkeypatch.setattr(poll_scheduler, "random", types.SimpleNamespace(uniform=lambda low, high: high))
+    assert schedule.next_delay() == pytest.approx(0.18)
+
+
+def test_first_poll_is_immediate_then_each_waits_its_interval(run, clock):
+    schedule = scheduler(budget=PollBudget(rate=0)).stream()
+    run(schedule.wait())
+    assert clock.sleeps == []
+    run(schedule.wait())
+    run(schedule.wait())
+    assert clock.sleeps == [pytest.approx(0.15), pytest.approx(0.15)]
@@ -0,0 +1,18 @@
+from api.utils.ratelimit import SlidingWindowRateLimiter
+
+
+def test_limit_holds_across_processes_sharing_redis(run, transport):
+    # Two instances of the proxy, each with its own in-process cache.
+    instances = [SlidingWindowRateLimiter(transport, max_requests=3, window=10) for _ in range(2)]
+    results = [run(instances[call % 2].limit("ratelimit:10.0.0.1")) for call in range(6)]
+    assert sum(result.allowed for result in results) == 3
+
+
+def test_blocked_identifiers_are_rejected_without_redis(run, transport):
+    limiter = SlidingWindowRateLimiter(transport, max_requests=3, window=10)
+    for _ in range(4):
+        run(limiter.limit("ratelimit:10.0.0.2"))
+    commands = transport.client.command_count
+    result = run(limiter.limit("ratelimit:10.0.0.2"))
+    assert not result.allowed and result.local
+    assert transport.client.command_count == commands
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+import api.index as index
+from api.utils.chunk_protocol import batch_fields
+from helpers import get_request, read_body
+
+
+async def add_later(key, *chunks, delay=0.2):
+    await asyncio.sleep(delay)
+    for chunk in chunks:
+        await index.redis.execute(["XADD", key, "*", "chunk", chunk])
+
+
+def test_last_event_id_resumes_right_after_that_entry_while_the_stream_is_live(run):
+    redis = index.redis
+    first = run(redis.execute(["XADD", "stream:resume-live", "*", "chunk", "one "]))
+    run(redis.execute(["XADD", "stream:resume-live", "*", *batch_fields(["two ", "three "])]))
+
+    async def resume():
+        producer = asyncio.create_task(add_later("stream:resume-live", "four", "[END_OF_STREAM]"))
+        response = await index.recover_chat_stream("resume-live", get_request({"Last-Event-ID": first}))
+        payload = await asyncio.wait_for(read_body(response), timeout=5)
+        await producer
+        return payload
+
+    payload = run(resume())
+    assert b"one " not in payload
+    assert b"two three " in payload
+    assert b"four" in payload
+    assert payload.endswith(b"data: [END_OF_STREAM]\n\n")
+
+
+def test_replay_cursor_is_the_oldest_pending_entry(run):
+    redis = index.redis
+    first = run(redis.execute(["XADD", "stream:cursor", "*", "chunk", "one "]))
+    run(redis.execute(["XADD", "stream:cursor", "*", "chunk", "two "]))
+    run(redis.execute(["XGROUP", "CREATE", "stream:cursor", "group:cursor", "0"]))
+    run(redis.execute(["XREADGROUP", "GROUP", "group:cursor", "consumer:cursor", "COUNT", "10", "STREAMS", "stream:cursor", ">"]))
+    assert run(index.get_replay_cursor("stream:cursor", "group:cursor")) == (first, True)
+
+
+def test_replay_cursor_survives_an_unexpected_reply_shape(monkeypatch, run):
+    async def reshaped_pipeline(commands):
+        # What redis-py makes of XPENDING unless its reply is kept raw.
+        return [[], {"pending": 2, "min": "1-0", "max": "2-0", "consumers": []}]
+
+    monkeypatch.setattr(index.redis, "pipeline", reshaped_pipeline)
+    assert run(index.get_replay_cursor("stream:cursor", "group:cursor")) == (None, False)
+
+
+def test_redis_transport_keeps_xpending_replies_raw():
+    redis_asyncio = pytest.importorskip("redis.asyncio")
+    from api.utils.stream_transport import RedisTransport
+
+    transport = RedisTransport(redis_asyncio.Redis())
+    reply = [2, "1-0", "2-0", [["consumer:a", "2"]]]
+    assert transport.client.response_callbacks["XPENDING"](reply) == reply
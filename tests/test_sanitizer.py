@@ -0,0 +1,44 @@
+import re
+
+import pytest
+
+from api.utils.sanitizer import RULE_ORDER, find_malicious_pattern, sanitize_content
+
+
+def reference(content):
+    """The rules as plain case-insensitive searches, in their check order."""
+    for pattern in RULE_ORDER:
+        if re.search(pattern, content, re.IGNORECASE | re.DOTALL):
+            return pattern
+    return None
+
+
+@pytest.mark.parametrize("content", [
+    "what projects has raghu worked on recently?",
+    "hi <script>alert(1)</script>",
+    '<img src=x onerror = "alert(1)">',
+    # Lowercasing these changes the text's length or letters; the scan must not rely on it.
+    "<img src=x onİ=1>",
+    "<ſcript>alert(1)</ſcript>",
+    "<ıframe src=x></IFRAME>",
+    "jAvaſcrıpt:alert(1)",
+    "VBSCRİPT:msgbox",
+    "<bUtton>x</BUTTON>",
+    "<buttonx=",
+    "<embed",
+    "if condition = x then",
+    # Event handlers: one try per word, from its first "on".
+    "bacon = crispy",
+    "on on on x=y",
+    "ONonON\t=1",
+    "xonyon  z=",
+    "onion rings, onions=good",
+    "<object>onload=x</object>",
+])
+def test_matches_the_rules_searched_one_by_one(content):
+    assert find_malicious_pattern(content) == reference(content)
+
+
+def test_rejects_event_handler_behind_a_dotted_capital_i():
+    with pytest.raises(ValueError):
+        sanitize_content("<img src=x onİ=1>")
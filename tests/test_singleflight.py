@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import api.index as index
+from api.utils.chunk_protocol import batch_fields
+from api.utils.singleflight import PromptSingleflight
+from helpers import chat_request, read_body, sse_data
+
+TOKENS = [f"t{i} " for i in range(10)]
+
+
+async def ask_all(content, host_prefix, delays, timeout=10):
+    """Sends `content` once per delay (from different clients) and reads every answer."""
+    async def ask(number, delay):
+        await asyncio.sleep(delay)
+        response = await index.handle_chat_data(chat_request(content, f"{host_prefix}.{number}"))
+        return await asyncio.wait_for(read_body(response), timeout)
+
+    return await asyncio.gather(*(ask(number, delay) for number, delay in enumerate(delays)))
+
+
+def test_staggered_duplicates_share_one_backend_call_and_every_token(monkeypatch, run):
+    calls = []
+
+    async def produce(stream_id):
+        for token in TOKENS:
+            await index.redis.execute(["XADD", f"stream:{stream_id}", "*", *batch_fields([token])])
+            await asyncio.sleep(0.02)
+        await index.redis.execute(["XADD", f"stream:{stream_id}", "*", *batch_fields(end=True)])
+
+    async def trigger(thread_id, stream_id, chat_request):
+        calls.append(stream_id)
+        await asyncio.sleep(0.15)  # duplicates keep arriving while this is in flight
+        asyncio.get_running_loop().create_task(produce(stream_id))
+
+    monkeypatch.setattr(index, "trigger_stream_generation", trigger)
+    monkeypatch.setattr(index.prompt_flights, "scope", "thread")
+
+    # Four during the trigger, two once tokens are already streaming.
+    payloads = run(ask_all("What is singleflight?", "10.0.0", [0, 0.04, 0.08, 0.12, 0.22, 0.3]))
+    assert len(calls) == 1
+    for payload in payloads:
+        assert sse_data(payload) == ("".join(TOKENS) + "[END_OF_STREAM]").encode()
+
+
+def test_followers_of_a_failed_trigger_end_with_the_error(monkeypatch, run):
+    async def trigger(thread_id, stream_id, chat_request):
+        await asyncio.sleep(0.1)
+        raise HTTPException(status_code=503, detail="backend down")
+
+    monkeypatch.setattr(index, "trigger_stream_generation", trigger)
+    monkeypatch.setattr(index.prompt_flights, "scope", "thread")
+
+    leader, follower = run(ask_all("Will this fail?", "10.0.1", [0, 0.03], timeout=5))
+    assert b"backend down" in leader
+    assert b"backend down" in follower
+    assert follower.endswith(b"data: [END_OF_STREAM]\n\n")
+    assert index.prompt_flights.lookup(index.prompt_flights.key("Will this fail?", "thread-1")) is None
+
+
+def test_followers_of_a_trigger_that_crashed_are_not_left_waiting(monkeypatch, run):
+    async def trigger(thread_id, stream_id, chat_request):
+        await asyncio.sleep(0.1)
+        raise RuntimeError("bug in the trigger")
+
+    monkeypatch.setattr(index, "trigger_stream_generation", trigger)
+    monkeypatch.setattr(index.prompt_flights, "scope", "thread")
+
+    async def leader_and_follower():
+        leader = asyncio.ensure_future(index.handle_chat_data(chat_request("Will this crash?", "10.0.2.0")))
+        await asyncio.sleep(0.03)
+        follower = await ask_all("Will this crash?", "10.0.2", [0], timeout=5)
+        with pytest.raises(RuntimeError):
+            await leader
+        return follower[0]
+
+    follower = run(leader_and_follower())
+    assert b"Internal error" in follower
+    assert index.prompt_flights.lookup(index.prompt_flights.key("Will this crash?", "thread-1")) is None
+
+
+def test_thread_scope_does_not_coalesce_requests_without_a_thread():
+    flights = PromptSingleflight(scope="thread")
+    assert flights.key("hello", None) is None
+    assert flights.key("hello", "") is None
+    assert flights.key("hello", "thread-1") != flights.key("hello", "thread-2")
+    assert PromptSingleflight(scope="content").key("hello", None) is not None
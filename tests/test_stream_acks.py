@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+import api.index as index
+from api.utils import stream_acks
+from api.utils.poll_scheduler import PollScheduler
+from api.utils.stream_acks import AckBatcher
+from helpers import sse_data
+
+STREAM = "stream:acks"
+GROUP = "group:acks"
+
+
+class RecordingTransport:
+    """Wraps a transport, recording each round-trip and failing pipelines on demand."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.name = transport.name
+        self.blocking = transport.blocking
+        self.round_trips = []
+        self.fail_pipelines = False
+
+    async def execute(self, command):
+        self.round_trips.append([command])
+        return await self.transport.execute(command)
+
+    async def pipeline(self, commands):
+        self.round_trips.append(commands)
+        if self.fail_pipelines:
+            raise ConnectionError("simulated")
+        return await self.transport.pipeline(commands)
+
+    def read_group_command(self, *args, **kwargs):
+        return self.transport.read_group_command(*args, **kwargs)
+
+
+@pytest.fixture
+def clock(clock):
+    return clock.install(stream_acks)
+
+
+@pytest.fixture
+def delivered(run, transport):
+    """Five entries read by one consumer of GROUP, so they are all pending."""
+    for index_ in range(5):
+        run(transport.execute(["XADD", STREAM, "*", "chunk", f"t{index_}"]))
+    run(transport.execute(["XGROUP", "CREATE", STREAM, GROUP, "0"]))
+    response = run(transport.execute(transport.read_group_command(GROUP, "consumer", STREAM, ">", count=10)))
+    return [entry_id for entry_id, _ in response[0][1]]
+
+
+def pending(run, transport):
+    return run(transport.execute(["XPENDING", STREAM, GROUP]))[0]
+
+
+def test_due_at_max_batch_or_max_delay(clock, transport):
+    acks = AckBatcher(transport, STREAM, GROUP, max_batch=3, max_delay=0.25)
+    acks.add("1-0")
+    acks.add("2-0")
+    assert not acks.due
+    clock.now += 0.25
+    assert acks.due
+
+    acks.take_command()
+    for entry_id in ("3-0", "4-0", "5-0"):
+        acks.add(entry_id)
+    assert acks.due
+
+
+def test_flush_empties_the_pending_list(run, transport, delivered):
+    acks = AckBatcher(transport, STREAM, GROUP)
+    for entry_id in delivered:
+        acks.add(entry_id)
+    assert pending(run, transport) == 5
+    run(acks.flush())
+    assert pending(run, transport) == 0
+    assert len(acks) == 0
+
+
+def test_xack_rides_along_with_the_next_read(run, transport, delivered):
+    recording = RecordingTransport(transport)
+    acks = AckBatcher(recording, STREAM, GROUP)
+    for entry_id in delivered[:3]:
+        acks.add(entry_id)
+
+    read = transport.read_group_command(GROUP, "consumer", STREAM, ">", count=10)
+    run(acks.read_group(read))
+    assert recording.round_trips == [[["XACK", STREAM, GROUP, *delivered[:3]], read]]
+    assert pending(run, transport) == 2
+
+    # Nothing to ack: the read goes out alone.
+    run(acks.read_group(read))
+    assert recording.round_trips[-1] == [read]
+
+
+def test_acks_are_restored_when_the_pipeline_fails(run, transport, delivered):
+    recording = RecordingTransport(transport)
+    acks = AckBatcher(recording, STREAM, GROUP)
+    for entry_id in delivered:
+        acks.add(entry_id)
+    recording.fail_pipelines = True
+
+    with pytest.raises(ConnectionError):
+        run(acks.read_group(transport.read_group_command(GROUP, "consumer", STREAM, ">", count=10)))
+    assert len(acks) == 5
+    run(acks.flush())
+    assert pending(run, transport) == 0
+
+
+def test_disconnect_flushes_what_was_yielded(monkeypatch, run, transport):
+    recording = RecordingTransport(transport)
+    recording.blocking = False  # polled, so the acks can't ride along with a read in flight
+    monkeypatch.setattr(index, "redis", recording)
+    monkeypatch.setattr(index, "dispatcher", None)
+    monkeypatch.setattr(index, "poll_scheduler", PollScheduler(min_interval=1, first_token_interval=1, jitter=0))
+    stream_id = "acks-on-disconnect"
+    stream_key = f"stream:{stream_id}"
+    for index_ in range(3):
+        run(transport.execute(["XADD", stream_key, "*", "chunk", f"t{index_}"]))
+
+    async def read_one_write_then_disconnect():
+        consumer = index.consume_stream_from_redis(stream_id)
+        first = await consumer.__anext__()
+        # The client took the write; the consumer is cancelled waiting for its next poll.
+        waiting = asyncio.ensure_future(consumer.__anext__())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.wait((waiting,))
+        await AckBatcher.wait_background()
+        return first
+
+    assert sse_data(run(read_one_write_then_disconnect())) == b"t0t1t2"
+    # Acked on the way out, though short of ACK_BATCH_SIZE, in a round-trip of its own.
+    assert recording.round_trips[-1][0][0] == "XACK"
+    assert run(transport.execute(["XPENDING", stream_key, f"group:{stream_id}"]))[0] == 0
@@ -0,0 +1,84 @@
+import pytest
+
+from api.utils import stream_cache
+from api.utils.chunk_protocol import batch_fields
+from api.utils.stream_cache import TerminalStreamCache
+
+
+@pytest.fixture
+def clock(clock):
+    return clock.install(stream_cache)
+
+
+async def materialize(cache, stream_id):
+    await cache.materialize_in_background(stream_id)
+
+
+def entries(size, count=4):
+    """`count` entries of `size` bytes each: 1-0 is all "a", 2-0 all "b", ..."""
+    return [(f"{number}-0", bytes([96 + number]) * size) for number in range(1, count + 1)]
+
+
+def test_least_recently_used_streams_go_first_once_over_budget(transport):
+    cache = TerminalStreamCache(transport, max_bytes=1000)
+    for stream_id in ("a", "b", "c"):
+        cache.put(stream_id, entries(60))  # 240 bytes each
+    cache.get("a")  # now the most recent
+    cache.put("d", entries(60))
+    cache.put("e", entries(60))
+
+    assert cache.get("b") is None
+    assert [cache.get(stream_id) is not None for stream_id in "acde"] == [True, True, True, True]
+    assert cache.size_bytes == 960 <= cache.max_bytes
+
+
+def test_streams_over_a_quarter_of_the_budget_are_not_cached(transport):
+    cache = TerminalStreamCache(transport, max_bytes=1000)
+    cache.put("small", entries(60))
+    cache.put("huge", entries(63))  # 252 bytes > 1000 // 4
+    assert cache.get("huge") is None
+    assert cache.get("small") is not None
+    assert len(cache) == 1
+
+
+def test_entries_expire_after_the_ttl(clock, transport):
+    cache = TerminalStreamCache(transport, ttl=600)
+    cache.put("a", entries(10))
+    clock.now += 599
+    assert cache.get("a") is not None
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.size_bytes == 0
+
+
+@pytest.mark.parametrize("after_id, inclusive, expected", [
+    (None, False, b"a" * 3 + b"b" * 3 + b"c" * 3 + b"d" * 3),
+    ("2-0", False, b"c" * 3 + b"d" * 3),
+    ("2-0", True, b"b" * 3 + b"c" * 3 + b"d" * 3),
+    ("2-5", True, b"c" * 3 + b"d" * 3),
+    ("4-0", False, b""),
+])
+def test_replay_from_a_cursor(transport, after_id, inclusive, expected):
+    cache = TerminalStreamCache(transport)
+    cache.put("a", entries(3))
+    assert cache.get("a").replay(after_id, inclusive) == expected
+
+
+def test_finished_stream_is_served_to_other_workers_from_the_redis_copy(run, transport):
+    for fields in (batch_fields(["Hel", "lo"]), batch_fields([" world"], end=True)):
+        run(transport.execute(["XADD", "stream:done", "*", *fields]))
+    writer = TerminalStreamCache(transport, redis_copy=True)
+    run(materialize(writer, "done"))
+    assert writer.get("done") is not None
+
+    reader = TerminalStreamCache(transport, redis_copy=True)
+    copy = run(reader.lookup("done"))
+    assert copy.replay() == writer.get("done").replay()
+    assert copy.replay().endswith(b"data: [END_OF_STREAM]\n\n")
+
+
+def test_unfinished_streams_are_not_materialized(run, transport):
+    run(transport.execute(["XADD", "stream:live", "*", *batch_fields(["still going"])]))
+    cache = TerminalStreamCache(transport)
+    run(materialize(cache, "live"))
+    assert cache.get("live") is None
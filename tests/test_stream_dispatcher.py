@@ -0,0 +1,165 @@
+"""Shared XREAD dispatcher against the in-memory FakeRedis."""
+import asyncio
+
+import pytest
+
+from api.utils.fake_redis import FakeRedis
+from api.utils.poll_scheduler import PollScheduler
+from api.utils.stream_dispatcher import StreamDispatcher
+from api.utils.stream_transport import MemoryTransport
+
+STREAM = "stream:test"
+
+
+class PollingTransport(MemoryTransport):
+    """The fake without BLOCK, like Upstash REST."""
+
+    blocking = False
+
+
+@pytest.fixture
+def dispatcher_for(run):
+    """Builds dispatchers on a transport and closes them after the test."""
+    dispatchers = []
+
+    def build(transport, **options):
+        dispatchers.append(StreamDispatcher(transport, **options))
+        return dispatchers[-1]
+
+    yield build
+    for dispatcher in dispatchers:
+        run(dispatcher.close())
+
+
+async def in_loop(method, *args):
+    """Calls a dispatcher method from inside the loop, since most of them start tasks."""
+    return method(*args)
+
+
+def subscribe(dispatcher, last_id, stream_key=STREAM):
+    return in_loop(dispatcher.subscribe, stream_key, last_id)
+
+
+def add(run, transport, *chunks):
+    return [run(transport.execute(["XADD", STREAM, "*", "chunk", chunk])) for chunk in chunks]
+
+
+async def collect(subscription, expected, timeout=2.0):
+    messages = []
+    deadline = asyncio.get_running_loop().time() + timeout
+    while len(messages) < expected:
+        remaining = deadline - asyncio.get_running_loop().time()
+        assert remaining > 0, f"got {[m[1][1] for m in messages]}"
+        messages += await subscription.get(timeout=remaining)
+    return [fields[1] for _, fields in messages]
+
+
+def test_subscriber_joining_behind_an_in_flight_read_gets_every_entry(run, transport, dispatcher_for):
+    dispatcher = dispatcher_for(transport, block_ms=1000)
+    ids = add(run, transport, *(f"t{index}" for index in range(9)))
+
+    # Up to date: the dispatcher blocks in XREAD from t8.
+    live = run(subscribe(dispatcher, ids[-1]))
+    run(asyncio.sleep(0.05))
+    # Joins behind that read (a recovery that saw up to t7).
+    behind = run(subscribe(dispatcher, ids[-2]))
+    add(run, transport, "t9")
+
+    assert run(collect(live, 1)) == ["t9"]
+    assert run(collect(behind, 2)) == ["t8", "t9"]
+
+
+def test_subscribers_at_different_cursors_each_get_what_they_have_not_seen(run, transport, dispatcher_for):
+    dispatcher = dispatcher_for(transport, block_ms=200)
+    ids = add(run, transport, *(f"t{index}" for index in range(5)))
+
+    first = run(subscribe(dispatcher, "0-0"))
+    second = run(subscribe(dispatcher, ids[2]))
+    assert run(collect(first, 5)) == ["t0", "t1", "t2", "t3", "t4"]
+    assert run(collect(second, 2)) == ["t3", "t4"]
+
+
+def test_polling_is_paced_by_the_poll_scheduler(run, dispatcher_for):
+    transport = PollingTransport(FakeRedis())
+    scheduler = PollScheduler(min_interval=0.01, max_interval=0.02, first_token_interval=0.01, jitter=0)
+    dispatcher = dispatcher_for(transport, scheduler=scheduler)
+    subscription = run(subscribe(dispatcher, "0-0"))
+    add(run, transport, "t0")
+    assert run(collect(subscription, 1)) == ["t0"]
+
+    # Idle: backs off to POLL_MAX_MS (here 20 ms), no further.
+    reads = transport.client.command_count
+    run(asyncio.sleep(0.5))
+    assert 15 <= transport.client.command_count - reads <= 30
+
+
+def test_full_subscriber_is_dropped_under_disconnect(run, transport, dispatcher_for):
+    dispatcher = dispatcher_for(transport, count=1, block_ms=100, queue_size=3)
+    slow = run(subscribe(dispatcher, "0-0"))
+    fast = run(subscribe(dispatcher, "0-0"))
+
+    async def fast_reader_while_adding():
+        reader = asyncio.create_task(collect(fast, 5))
+        for index in range(5):
+            await transport.execute(["XADD", STREAM, "*", "chunk", f"t{index}"])
+        return await reader
+
+    assert run(fast_reader_while_adding()) == ["t0", "t1", "t2", "t3", "t4"]
+    assert slow.overflowed
+    # What was queued is still handed out, then the consumer learns it was dropped.
+    assert run(collect(slow, 3)) == ["t0", "t1", "t2"]
+    assert run(slow.get(timeout=1)) == []
+
+
+def test_full_subscriber_catches_up_under_wait_without_holding_back_others(run, transport, dispatcher_for):
+    dispatcher = dispatcher_for(transport, count=1, block_ms=100, queue_size=3, slow_subscriber_policy="wait")
+    slow = run(subscribe(dispatcher, "0-0"))
+    fast = run(subscribe(dispatcher, "0-0"))
+    expected = [f"t{index}" for index in range(8)]
+
+    async def fast_reader_while_adding():
+        reader = asyncio.create_task(collect(fast, 8))
+        for chunk in expected:
+            await transport.execute(["XADD", STREAM, "*", "chunk", chunk])
+        return await reader
+
+    assert run(fast_reader_while_adding()) == expected
+    assert slow.queue.qsize() == 3
+    assert run(collect(slow, 8)) == expected
+    assert not slow.overflowed
+
+
+def test_subscriber_joining_during_a_blocking_read_does_not_wait_it_out(run, transport, dispatcher_for):
+    dispatcher = dispatcher_for(transport, block_ms=2000)
+    run(subscribe(dispatcher, "0-0"))
+    run(asyncio.sleep(0.05))  # the dispatcher now blocks for 2s on STREAM only
+
+    other = "stream:other"
+    joined = run(subscribe(dispatcher, "0-0", other))
+    run(transport.execute(["XADD", other, "*", "chunk", "t0"]))
+    assert run(collect(joined, 1, timeout=0.5)) == ["t0"]
+
+
+def test_group_cursor_is_checkpointed_while_delivering(run, transport, dispatcher_for):
+    dispatcher = dispatcher_for(transport, block_ms=100, cursor_interval=0.1)
+    ids = add(run, transport, "t0", "t1", "t2")
+    run(transport.execute(["XGROUP", "CREATE", STREAM, "group", "0"]))
+
+    async def cursor():
+        await asyncio.sleep(0.01)  # let the background save run
+        groups = await transport.execute(["XINFO", "GROUPS", STREAM])
+        return dict(zip(groups[0][::2], groups[0][1::2]))["last-delivered-id"]
+
+    subscription = run(subscribe(dispatcher, "0-0"))
+    subscription.mark_delivered(ids[0])
+    run(in_loop(dispatcher.checkpoint, subscription, "group"))
+    assert run(cursor()) == "0-0"  # too soon after subscribing
+
+    run(asyncio.sleep(0.1))
+    subscription.mark_delivered(ids[1])
+    run(in_loop(dispatcher.checkpoint, subscription, "group"))
+    assert run(cursor()) == ids[1]
+
+    subscription.mark_delivered(ids[2])
+    run(in_loop(dispatcher.release, subscription, "group"))
+    assert run(cursor()) == ids[2]
@@ -0,0 +1,38 @@
+from api.utils.stream_lifecycle import StreamLifecycle
+
+
+async def retire(lifecycle, stream_key, group_name):
+    lifecycle.retire_in_background(stream_key, group_name)
+    await lifecycle.close()
+
+
+def test_sweep_keeps_empty_streams_and_deletes_idle_ones(run, transport):
+    lifecycle = StreamLifecycle(transport, ttl=3600, sweep_idle=3600)
+    # A consumer that just started: MKSTREAM made an empty stream, on_created gave it a TTL.
+    run(transport.execute(["XGROUP", "CREATE", "stream:fresh", "group:fresh", "0", "MKSTREAM"]))
+    run(lifecycle.on_created("stream:fresh"))
+    # The same, caught between XGROUP CREATE and the EXPIRE.
+    run(transport.execute(["XGROUP", "CREATE", "stream:creating", "group:creating", "0", "MKSTREAM"]))
+    # Last written long ago.
+    run(transport.execute(["XADD", "stream:idle", "1000-0", "chunk", "old"]))
+
+    stats = run(lifecycle.sweep())
+    assert stats["deleted"] == 1 and stats["ttl_added"] == 1
+    assert [run(transport.execute(["EXISTS", key])) for key in ("stream:fresh", "stream:creating", "stream:idle")] == [1, 1, 0]
+    assert run(transport.execute(["TTL", "stream:creating"])) > 0
+
+
+def test_retired_stream_expires_after_the_grace_period_instead_of_being_deleted(run, transport):
+    lifecycle = StreamLifecycle(transport, ttl=3600, retire_grace=30)
+    run(transport.execute(["XADD", "stream:done", "*", "chunk", "[END_OF_STREAM]"]))
+    for group in ("group:a", "group:b"):
+        run(transport.execute(["XGROUP", "CREATE", "stream:done", group, "0"]))
+    run(lifecycle.on_created("stream:done"))
+
+    # Another client still follows it: the stream keeps its TTL.
+    run(retire(lifecycle, "stream:done", "group:a"))
+    assert run(transport.execute(["TTL", "stream:done"])) > 30
+
+    run(retire(lifecycle, "stream:done", "group:b"))
+    assert run(transport.execute(["XLEN", "stream:done"])) == 1
+    assert 0 < run(transport.execute(["TTL", "stream:done"])) <= 30
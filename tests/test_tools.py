@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api.utils import tools
+from api.utils.http_client import http_clients
+
+
+@pytest.fixture
+def upstream(monkeypatch, clock):
+    """Serves the canned forecast (slowly, so lookups overlap); returns the requests it got."""
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return tools.mock_weather_handler(request)
+
+    clock.install(tools)
+    monkeypatch.setattr(tools, "weather_cache", tools.WeatherCache(ttl=600))
+    monkeypatch.setitem(http_clients._clients, "weather", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return requests
+
+
+def test_coordinates_snap_to_their_grid_cell():
+    assert tools.grid_cell(52.5200, 13.4050, size=0.1) == (52.5, 13.4)
+    assert tools.grid_cell(52.5499, 13.3501, size=0.1) == (52.5, 13.4)
+    assert tools.grid_cell(-33.8688, 151.2093, size=0.5) == (-34.0, 151.0)
+
+
+def test_lookups_in_one_cell_share_a_cached_forecast(run, upstream, clock):
+    first = run(tools.get_current_weather(52.52, 13.405))
+    assert run(tools.get_current_weather(52.5249, 13.41)) == first
+    assert len(upstream) == 1
+    assert upstream[0].url.params["latitude"] == "52.5"
+
+    # Another cell is a separate upstream call.
+    run(tools.get_current_weather(48.137, 11.575))
+    assert len(upstream) == 2
+    assert tools.weather_cache.hits == 1
+
+
+def test_forecasts_are_fetched_again_after_the_ttl(run, upstream, clock):
+    run(tools.get_current_weather(52.52, 13.405))
+    clock.now += 599
+    run(tools.get_current_weather(52.52, 13.405))
+    assert len(upstream) == 1
+    clock.now += 1
+    run(tools.get_current_weather(52.52, 13.405))
+    assert len(upstream) == 2
+
+
+def test_concurrent_lookups_for_a_cell_make_one_upstream_call(run, upstream):
+    async def lookups():
+        return await asyncio.gather(*(tools.get_current_weather(52.52, 13.405) for _ in range(20)))
+
+    forecasts = run(lookups())
+    assert len(upstream) == 1
+    assert all(forecast == forecasts[0] for forecast in forecasts)
+    assert forecasts[0]["current"]["temperature_2m"] is not None
+
+
+def test_failures_are_not_cached(monkeypatch, run, clock):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    clock.install(tools)
+    monkeypatch.setattr(tools, "weather_cache", tools.WeatherCache())
+    monkeypatch.setitem(http_clients._clients, "weather", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    assert run(tools.get_current_weather(52.52, 13.405)) is None
+    assert run(tools.get_current_weather(52.52, 13.405)) is None
+    assert len(calls) == 2
@@ -1,44 +1,80 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import random
 import sys
-import json
 from datetime import datetime
 from typing import Any
 from pythonjsonlogger import jsonlogger
 from dotenv import load_dotenv
-import sentry_sdk
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from sentry_sdk.integrations.asyncio import AsyncioIntegration
-from sentry_sdk.integrations.logging import LoggingIntegration
 
 # Load .env files only if they exist
-if os.path.exists('.env'):
+HAS_DOTENV = os.path.exists('.env')
+if HAS_DOTENV:
     load_dotenv('.env')
-else:
+
+# LAZY_STARTUP=1 (serverless cold starts): Sentry is set up from the app lifespan
+# instead of at import, without auto-enabled integrations and without the FastAPI
+# one: by then the routes and middleware stack are built, so its patches can't
+# apply. Errors still arrive through logging and asyncio; request transactions
+# and automatic capture of unhandled route exceptions are lost.
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0") == "1"
+
+_sentry_initialized = False
+
+
+def init_sentry() -> None:
+    """
+    Sets up Sentry once per process. Skipped in development (a `.env` file
+    exists) and when SENTRY_DSN is unset, where the SDK would only cost import
+    and patching time without sending anything.
+    """
+    global _sentry_initialized
+    if _sentry_initialized or HAS_DOTENV or not os.getenv("SENTRY_DSN"):
+        return
+    _sentry_initialized = True
+
+    import sentry_sdk
+    from sentry_sdk.integrations.asyncio import AsyncioIntegration
+    from sentry_sdk.integrations.logging import LoggingIntegration
+
+    integrations = [
+        AsyncioIntegration(),
+        # ADD THIS: LoggingIntegration for capturing logs
+        LoggingIntegration(
+            level=logging.INFO,        # Capture INFO+ as breadcrumbs
+            event_level=logging.WARNING,  # Send INFO+ as events to Sentry
+        ),
+    ]
+    if not LAZY_STARTUP:
+        # Patches FastAPI/Starlette, so it only works before the app is built.
+        from sentry_sdk.integrations.fastapi import FastApiIntegration
+
+        integrations.insert(0, FastApiIntegration())
+
     sentry_sdk.init(
         dsn=os.getenv("SENTRY_DSN"),    
         environment="production",  
-        traces_sample_rate=1.0,   
-        profiles_sample_rate=1.0, 
-        integrations=[
-            FastApiIntegration(),
-            AsyncioIntegration(),
-            # ADD THIS: LoggingIntegration for capturing logs
-            LoggingIntegration(
-                level=logging.INFO,        # Capture INFO+ as breadcrumbs
-                event_level=logging.WARNING,  # Send INFO+ as events to Sentry
-            ),
-        ],
+        # Every request is traced and profiled unless these say otherwise; lower
+        # them on busy deployments, where that costs CPU on every chunk.
+        traces_sample_rate=float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", "1.0")),
+        profiles_sample_rate=float(os.getenv("SENTRY_PROFILES_SAMPLE_RATE", "1.0")),
+        integrations=integrations,
+        # Probing for every installed library (redis, httpx, ...) is most of init's cost.
+        auto_enabling_integrations=not LAZY_STARTUP,
         send_default_pii=True,
         # Enable logs to be sent to Sentry
         enable_logs=True,
         _experiments={
-            "continuous_profiling_auto_start": True,        
+            "continuous_profiling_auto_start": os.getenv("SENTRY_CONTINUOUS_PROFILING", "0") == "1",
         },
     )
-    
-    logger = logging.getLogger()  # Root logger
-    logger.info("SENTRY TEST: This info should appear somewhere")
+
+
+if not LAZY_STARTUP:
+    init_sentry()
 
 
 class CustomJsonFormatter(jsonlogger.JsonFormatter):
@@ -51,16 +87,86 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
             "service": "nextjs-api"
         })
 
+def _parse_mapping(value: str) -> dict[str, str]:
+    """Parses "name=value,other=value" env vars."""
+    mapping = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, setting = item.partition("=")
+        mapping[name.strip()] = setting.strip()
+    return mapping
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of sub-WARNING records from the configured loggers
+    (and their children), e.g. LOG_SAMPLE_RATES="chatraghu.stream=0.01".
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return random.random() < rate
+            name = name.rpartition(".")[0]
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves JSON formatting to the listener thread.
+
+    The stock `prepare` formats every record on the calling thread, which is
+    the event loop here; we only merge the message args so the record is
+    safe to hand over.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
 def setup_logger():
+    """
+    Root logger with a queue-backed pipeline: the request path only enqueues
+    records, a background QueueListener formats and writes them.
+
+    Configured from the environment:
+    - LOG_LEVEL: root level (default INFO)
+    - LOG_LEVELS: per-logger levels, e.g. "chatraghu.stream=DEBUG,httpx=WARNING"
+    - LOG_SAMPLE_RATES: per-logger sampling of sub-WARNING records
+      (default "chatraghu.stream=0.01", 1% of the stream hot-loop logs)
+    """
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-    
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_mapping(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(CustomJsonFormatter(
         '%(timestamp)s %(level)s %(name)s %(message)s'
     ))
-    logger.addHandler(console_handler)
-    
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    rates = _parse_mapping(os.getenv("LOG_SAMPLE_RATES", "chatraghu.stream=0.01"))
+    queue_handler.addFilter(SamplingFilter({name: float(rate) for name, rate in rates.items()}))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued on interpreter shutdown.
+    atexit.register(listener.stop)
+
     return logger
 
 